@@ -2,81 +2,118 @@ import ast
 
 class AddDefaultArgValue(ast.NodeTransformer):
     def __init__(self):
-        self.func_par_map = {}
+        self.func_par_map = {}  # Qualified function name -> [(param, value)]
         self.used_params = set()
+        self.functions = []  # (function node, [(param, value)])
+        self.call_sites = []  # (call node, const->param maps of enclosing functions, outermost first)
 
     def collect_mappings(self, tree):
-        for node in ast.walk(tree):
+        # One depth-first pass records, per function, the parameters to add and,
+        # per call that has string constants, the chain of enclosing functions.
+        self.func_par_map = {}
+        self.functions = []
+        self.call_sites = []
+        stack = [(tree, (), ())]
+        while stack:
+            node, scope, enclosing = stack.pop()
             if isinstance(node, ast.FunctionDef):
-                self.used_params.clear()
-                for arg in node.args.args:
-                    self.used_params.add(arg.arg)
-                const_param = {}
-                arguments_list = []
-                var_index= 0
-                for stmt in node.body:
-                    if isinstance(stmt, ast.Assign) and isinstance(stmt.value, ast.Call):
-                        for arg in stmt.value.args:
-                            if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
-                                value = arg.value
-                                if value not in const_param:
-                                    param_name = f"var{var_index}"
-                                    while param_name in self.used_params:
-                                        var_index+= 1
-                                        param_name = f"var{var_index}"
-                                    const_param[value] = param_name
-                                    arguments_list.append((param_name, value))
-                                    self.used_params.add(param_name)
-                                    var_index+= 1
-                        for kw in stmt.value.keywords:
-                            if isinstance(kw.value, ast.Constant) and isinstance(kw.value.value, str):
-                                value = kw.value.value
-                                if value not in const_param:
-                                    param_name = kw.arg if kw.arg else f"var{var_index}"
-                                    while param_name in self.used_params:
-                                        var_index+= 1
-                                        param_name = f"var{var_index}"
-                                    const_param[value] = param_name
-                                    arguments_list.append((param_name, value))
-                                    self.used_params.add(param_name)
-                                    var_index+= 1
-                self.func_par_map[node.name] = arguments_list
+                scope = scope + (node.name,)
+                arguments_list = self.collect_function_params(node)
+                self.func_par_map[".".join(scope)] = arguments_list
+                const_param = {value: param for param, value in arguments_list}
+                self.functions.append((node, arguments_list))
+                enclosing = enclosing + (const_param,)
+            elif isinstance(node, ast.ClassDef):
+                scope = scope + (node.name,)
+            elif isinstance(node, ast.Call) and enclosing and self.has_string_constants(node):
+                self.call_sites.append((node, enclosing))
+            children = list(ast.iter_child_nodes(node))
+            for child in reversed(children):
+                stack.append((child, scope, enclosing))
         return tree
 
+    def collect_function_params(self, node):
+        self.used_params.clear()
+        for arg in node.args.args:
+            self.used_params.add(arg.arg)
+        const_param = {}
+        arguments_list = []
+        var_index= 0
+        for stmt in node.body:
+            if isinstance(stmt, ast.Assign) and isinstance(stmt.value, ast.Call):
+                for arg in stmt.value.args:
+                    if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                        value = arg.value
+                        if value not in const_param:
+                            param_name = f"var{var_index}"
+                            while param_name in self.used_params:
+                                var_index+= 1
+                                param_name = f"var{var_index}"
+                            const_param[value] = param_name
+                            arguments_list.append((param_name, value))
+                            self.used_params.add(param_name)
+                            var_index+= 1
+                for kw in stmt.value.keywords:
+                    if isinstance(kw.value, ast.Constant) and isinstance(kw.value.value, str):
+                        value = kw.value.value
+                        if value not in const_param:
+                            param_name = kw.arg if kw.arg else f"var{var_index}"
+                            while param_name in self.used_params:
+                                var_index+= 1
+                                param_name = f"var{var_index}"
+                            const_param[value] = param_name
+                            arguments_list.append((param_name, value))
+                            self.used_params.add(param_name)
+                            var_index+= 1
+        return arguments_list
+
+    @staticmethod
+    def has_string_constants(call_node):
+        return (any(isinstance(arg, ast.Constant) and isinstance(arg.value, str) for arg in call_node.args) or
+                any(isinstance(kw.value, ast.Constant) and isinstance(kw.value.value, str) for kw in call_node.keywords))
+
+    @staticmethod
+    def lookup_param(value, enclosing):
+        # The outermost enclosing function that lifted this constant wins, as
+        # its rewrite reaches into nested functions before theirs do.
+        for const_param in enclosing:
+            if value in const_param:
+                return const_param[value]
+        return None
+
     def transform_functions(self, tree):
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef) and node.name in self.func_par_map:
-                const_param = {value: param for param, value in self.func_par_map[node.name]}
-                for param, value in self.func_par_map[node.name]:
-                    node.args.args.append(ast.arg(arg=param))
-                    node.args.defaults.append(ast.Constant(value=value))
-                
-                class ReplaceConstantsInCalls(ast.NodeTransformer):
-                    def visit_Call(self, call_node):
-                        self.generic_visit(call_node) 
-                        new_args = []
-                        for arg in call_node.args:
-                            if isinstance(arg, ast.Constant) and arg.value in const_param:
-                                new_args.append(ast.Name(id=const_param[arg.value], ctx=ast.Load()))
-                            else:
-                                new_args.append(arg)
-                        call_node.args = new_args
-                        new_keywords = []
-                        for kw in call_node.keywords:
-                            if isinstance(kw.value, ast.Constant) and kw.value.value in const_param:
-                                new_keywords.append(ast.keyword(arg=kw.arg, value=ast.Name(id=const_param[kw.value.value], ctx=ast.Load())))
-                            else:
-                                new_keywords.append(kw)
-                        call_node.keywords = new_keywords
-                        return call_node
-                ReplaceConstantsInCalls().visit(node)
+        for node, arguments_list in self.functions:
+            for param, value in arguments_list:
+                node.args.args.append(ast.arg(arg=param))
+                node.args.defaults.append(ast.Constant(value=value))
+
+        for call_node, enclosing in self.call_sites:
+            new_args = []
+            for arg in call_node.args:
+                param = self.lookup_param(arg.value, enclosing) if isinstance(arg, ast.Constant) else None
+                if param is not None:
+                    new_args.append(ast.Name(id=param, ctx=ast.Load()))
+                else:
+                    new_args.append(arg)
+            call_node.args = new_args
+            new_keywords = []
+            for kw in call_node.keywords:
+                param = self.lookup_param(kw.value.value, enclosing) if isinstance(kw.value, ast.Constant) else None
+                if param is not None:
+                    new_keywords.append(ast.keyword(arg=kw.arg, value=ast.Name(id=param, ctx=ast.Load())))
+                else:
+                    new_keywords.append(kw)
+            call_node.keywords = new_keywords
         return tree
 
+    def transform_tree(self, tree):
+        tree = self.collect_mappings(tree)
+        return self.transform_functions(tree)
+
     def get_refactored_code(self, source_code):
         try:
             tree = ast.parse(source_code)
-            tree = self.collect_mappings(tree)
-            tree = self.transform_functions(tree)
+            tree = self.transform_tree(tree)
             ast.fix_missing_locations(tree)
             return ast.unparse(tree)
         except SyntaxError as e:
@@ -21,10 +21,16 @@ class AddAssertions(ast.NodeTransformer):
 
         return node
 
+    def rewrite_statement(self, stmt):
+        return [self.visit(stmt)]
+
+    def transform_tree(self, tree):
+        return self.visit(tree)
+
     def get_refactored_code(self, source_code):
         try:
             tree = ast.parse(source_code)
-            tree = self.visit(tree)
+            tree = self.transform_tree(tree)
             ast.fix_missing_locations(tree)
             return ast.unparse(tree)
         except SyntaxError as e:
@@ -0,0 +1,198 @@
+import argparse
+import ast
+import contextlib
+import gc
+import io
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+
+from benchmarks.synthetic import SyntheticModule
+from parse_cache import clone_tree
+from pipeline import TRANSFORMERS
+
+# Each case doubles the work of the previous one, so a transformer whose
+# transform time grows ~4x per step is quadratic.
+DEFAULT_CASES = {
+    "small": dict(functions=25, classes=4, methods_per_class=4, module_constants=50),
+    "medium": dict(functions=50, classes=8, methods_per_class=4, module_constants=100),
+    "large": dict(functions=100, classes=16, methods_per_class=4, module_constants=200),
+    "xlarge": dict(functions=200, classes=32, methods_per_class=4, module_constants=400),
+}
+
+
+def time_call(func, *args):
+    gc.collect()
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def measure(name, source_code, repeat):
+    parse_times, transform_times, unparse_times = [], [], []
+    base_tree = ast.parse(source_code)
+    nodes = sum(1 for _ in ast.walk(base_tree))
+    for _ in range(repeat):
+        parse_time, _ = time_call(ast.parse, source_code)
+        tree = clone_tree(base_tree)
+        transform_time, tree = time_call(TRANSFORMERS[name]().transform_tree, tree)
+
+        def finish(tree):
+            ast.fix_missing_locations(tree)
+            return ast.unparse(tree)
+
+        unparse_time, _ = time_call(finish, tree)
+        parse_times.append(parse_time)
+        transform_times.append(transform_time)
+        unparse_times.append(unparse_time)
+
+    # Separate run so tracemalloc's overhead does not leak into the timings.
+    tree = clone_tree(base_tree)
+    tracemalloc.start()
+    try:
+        TRANSFORMERS[name]().transform_tree(tree)
+        ast.unparse(ast.fix_missing_locations(tree))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # Best of ``repeat``: the least noisy estimate for comparing two runs.
+    transform_time = min(transform_times)
+    return {
+        "nodes": nodes,
+        "parse_s": min(parse_times),
+        "transform_s": transform_time,
+        "unparse_s": min(unparse_times),
+        "nodes_per_sec": nodes / transform_time if transform_time else None,
+        "peak_bytes": peak,
+    }
+
+
+def scaling_exponents(results):
+    # Least-squares slope of log(transform time) against log(nodes) across the
+    # cases: ~1 is linear, ~2 quadratic.
+    points = {}
+    for row in results:
+        if "error" not in row and row["transform_s"] > 0:
+            points.setdefault(row["transformer"], []).append((math.log(row["nodes"]), math.log(row["transform_s"])))
+    exponents = {}
+    for name, xy in points.items():
+        if len({x for x, _ in xy}) < 2:
+            continue
+        mean_x = sum(x for x, _ in xy) / len(xy)
+        mean_y = sum(y for _, y in xy) / len(xy)
+        slope = (sum((x - mean_x) * (y - mean_y) for x, y in xy) /
+                 sum((x - mean_x) ** 2 for x, _ in xy))
+        exponents[name] = round(slope, 2)
+    return exponents
+
+
+def failing_transformers(results):
+    """Transformers that raised in every case they ran, so they have no timings at all."""
+    outcomes = {}
+    for row in results:
+        outcomes.setdefault(row["transformer"], []).append("error" in row)
+    return [name for name, errors in outcomes.items() if all(errors)]
+
+
+def run(transformers, cases, repeat, seed):
+    results = []
+    for case, params in cases.items():
+        generator = SyntheticModule(seed=seed, **params)
+        source_code = generator.render()
+        for name in transformers:
+            row = {"transformer": name, "case": case, "params": generator.params(), "bytes": len(source_code)}
+            try:
+                # Some transformers print while they work; keep the report readable.
+                with contextlib.redirect_stdout(io.StringIO()):
+                    row.update(measure(name, source_code, repeat))
+            except Exception as e:
+                row["error"] = f"{type(e).__name__}: {e}"
+            results.append(row)
+            if "error" in row:
+                print(f"{case:>8} {name:<14} ERROR {row['error']}")
+            else:
+                print(f"{case:>8} {name:<14} nodes={row['nodes']:>7} parse={row['parse_s'] * 1e3:8.2f}ms "
+                      f"transform={row['transform_s'] * 1e3:8.2f}ms unparse={row['unparse_s'] * 1e3:8.2f}ms "
+                      f"{row['nodes_per_sec'] or 0:>12,.0f} nodes/s peak={row['peak_bytes'] / 1024:9.1f}KiB")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": results,
+        "scaling": scaling_exponents(results),
+    }
+
+
+def compare(baseline_path, current_path, threshold):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(current_path, 'r', encoding='utf-8') as f:
+        current = json.load(f)
+
+    previous = {(row["transformer"], row["case"]): row for row in baseline["results"] if "error" not in row}
+    regressions = []
+    for row in current["results"]:
+        old = previous.get((row["transformer"], row["case"]))
+        if old is None or "error" in row:
+            continue
+        for metric in ("transform_s", "peak_bytes"):
+            if old[metric] and row[metric] / old[metric] > threshold:
+                regressions.append((row["transformer"], row["case"], metric, old[metric], row[metric]))
+
+    for name, exponent in current.get("scaling", {}).items():
+        old_exponent = baseline.get("scaling", {}).get(name)
+        print(f"{name:<14} scaling exponent {old_exponent} -> {exponent}")
+    for name, case, metric, old, new in regressions:
+        print(f"REGRESSION {name} [{case}] {metric}: {old:.6g} -> {new:.6g} ({new / old:.2f}x)")
+    if not regressions:
+        print(f"No regressions above {threshold:.2f}x")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput benchmarks for the AST transformers.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks and save the results as JSON")
+    run_parser.add_argument("--output", default="bench_results.json")
+    run_parser.add_argument("--transformer", action="append", choices=list(TRANSFORMERS),
+                            help="Only benchmark these transformers (repeatable)")
+    run_parser.add_argument("--case", action="append", choices=list(DEFAULT_CASES),
+                            help="Only run these corpus sizes (repeatable)")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--seed", type=int, default=0)
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two saved runs")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=1.25,
+                                help="Flag metrics that grew by more than this factor")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        sys.exit(1 if compare(args.baseline, args.current, args.threshold) else 0)
+
+    args.output = getattr(args, "output", "bench_results.json")
+    transformers = getattr(args, "transformer", None) or list(TRANSFORMERS)
+    cases = {name: DEFAULT_CASES[name] for name in (getattr(args, "case", None) or DEFAULT_CASES)}
+    report = run(transformers, cases, getattr(args, "repeat", 5), getattr(args, "seed", 0))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print("Scaling exponents:", report["scaling"])
+    print(f"Saved results to {args.output}")
+    failing = failing_transformers(report["results"])
+    if failing:
+        print(f"ERROR: no case could be measured for: {', '.join(failing)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import random
+
+from funcvaridentifier import VariableRefactator
+
+PLAIN_NAMES = ["value", "item", "count", "total", "result", "buffer", "index", "chunk"]
+CALLEES = ["str", "print", "format", "max", "min", "sorted", "dict", "partial"]
+
+
+class SyntheticModule:
+    """Deterministic generator of Python modules shaped like our corpus.
+
+    functions           number of top-level functions
+    classes             number of classes; every class reuses the same method
+                        names, which is what trips name-keyed bookkeeping
+    methods_per_class   methods per class
+    nesting_depth       depth of nested function definitions inside each function
+    constants_per_call  string/int constants passed to each call
+    statements          assignment statements per function body
+    identifier_density  share of names drawn from VariableRefactator's rename table
+    module_constants    module-level NAME = constant assignments
+    target_bytes        keep adding functions until the module reaches this size
+    """
+
+    def __init__(self, functions=20, classes=2, methods_per_class=4, nesting_depth=1, constants_per_call=2,
+                 statements=4, identifier_density=0.3, module_constants=10, target_bytes=0, seed=0):
+        self.functions = functions
+        self.classes = classes
+        self.methods_per_class = methods_per_class
+        self.nesting_depth = nesting_depth
+        self.constants_per_call = constants_per_call
+        self.statements = statements
+        self.identifier_density = identifier_density
+        self.module_constants = module_constants
+        self.target_bytes = target_bytes
+        self.seed = seed
+        self.special_names = list(VariableRefactator().identifiers)
+
+    def params(self):
+        return {key: value for key, value in vars(self).items() if key != "special_names"}
+
+    def name(self, rng):
+        if rng.random() < self.identifier_density:
+            return rng.choice(self.special_names)
+        return rng.choice(PLAIN_NAMES)
+
+    def call(self, rng, args):
+        constants = [repr(f"c{rng.randrange(50)}") if rng.random() < 0.7 else str(rng.randrange(100))
+                     for _ in range(self.constants_per_call)]
+        keyword = f", sep={repr(f'k{rng.randrange(10)}')}" if rng.random() < 0.3 else ""
+        return f"{rng.choice(CALLEES)}({', '.join(constants + args)}{keyword})"
+
+    def function(self, rng, name, indent, depth, params):
+        pad = "    " * indent
+        lines = [f"{pad}def {name}({', '.join(params)}):"]
+        local_names = [p for p in params if p != "self"]
+        for _ in range(self.statements):
+            target = self.name(rng)
+            args = rng.sample(local_names, min(len(local_names), 2))
+            lines.append(f"{pad}    {target} = {self.call(rng, args)}")
+            local_names.append(target)
+        if depth < self.nesting_depth:
+            inner = f"{name}_inner{depth}"
+            lines.extend(self.function(rng, inner, indent + 1, depth + 1, [self.name(rng)]))
+            lines.append(f"{pad}    {local_names[-1]} = {inner}({local_names[0] if local_names else 'None'})")
+        lines.append(f"{pad}    return {local_names[-1] if local_names else 'None'}")
+        return lines
+
+    def render(self):
+        rng = random.Random(self.seed)
+        lines = ["from functools import partial", ""]
+        constants = []
+        for index in range(self.module_constants):
+            constant = f"CONST_{index}"
+            constants.append(constant)
+            lines.append(f"{constant} = {repr(f'v{index}') if index % 2 else index}")
+        lines.append("")
+
+        def add_function(index):
+            name = self.special_names[index] if index < len(self.special_names) else f"func_{index}"
+            params = [self.name(rng) for _ in range(rng.randrange(1, 4))]
+            lines.extend(self.function(rng, name, 0, 0, list(dict.fromkeys(params))))
+            if index % 5 == 0:
+                lines.append(f"{name}.__doc__ = {repr(f'Docs for {name}')}")
+            if index % 3 == 0:
+                lines.append(f"def {name}_short(x):")
+                lines.append(f"    return x + {index}")
+            lines.append("")
+
+        for index in range(self.functions):
+            add_function(index)
+        for class_index in range(self.classes):
+            lines.append(f"class Service{class_index}:")
+            for method_index in range(self.methods_per_class):
+                method = self.special_names[method_index % len(self.special_names)]
+                lines.extend(self.function(rng, method, 1, self.nesting_depth, ["self", self.name(rng)]))
+                lines.append(f"    {repr(f'{method} docs')}")
+            lines.append("")
+        for constant in constants[:len(constants) // 2]:
+            lines.append(f"bound_{constant.lower()} = partial(print, {constant})")
+
+        index = self.functions
+        while self.target_bytes and sum(len(line) + 1 for line in lines) < self.target_bytes:
+            add_function(index)
+            index += 1
+        return "\n".join(lines) + "\n"
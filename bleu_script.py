@@ -1,69 +1,325 @@
+import argparse
+import itertools
 import os
-from codebleu import calc_codebleu
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import instrument
+import profiling
+from codebleu_engine import CodeBLEUScorer
+from corpus_index import VARIANT_PATTERN, CorpusIndex
+from diffexec import rename_candidates
+from fingerprint import fingerprint
+from hashing import content_hash
+from ngram_engine import NgramEngine, validate
+from result_sink import ResultSink, detect_format
+from score_cache import DEFAULT_SCORE_CACHE, LOOKUP_CHUNK, ScoreCache
+from validity import check_variant
+
+ENGINES = ["full", "ngram"]
+# The n-gram engine is vectorized across a batch, so it wants much larger ones.
+DEFAULT_BATCH_SIZES = {"full": 32, "ngram": 4096}
+METRIC_LABELS = [
+    ("codebleu", "CodeBLEU Score"),
+    ("ngram_match_score", "N-gram Match"),
+    ("weighted_ngram_match_score", "Weighted N-gram Match"),
+    ("syntax_match_score", "Syntax Match (AST)"),
+    ("dataflow_match_score", "Dataflow Match"),
+]
+
+_worker = {}
+
+# Files kept by the per-pair profiler, merged from every worker; reported by main().
+PROFILED = []
 
 def read_file(file_path):
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
+        with instrument.timed("read", file=file_path), open(file_path, 'r', encoding='utf-8') as f:
             return f.read()
     except Exception as e:
         print(f"Error reading {file_path}: {e}")
         return None
 
-def compare_code_files(source_dir, target_dir, lang="python", weights=(0.25, 0.25, 0.25, 0.25)):
-    results = {}
-    
-    if not os.path.exists(source_dir) or not os.path.exists(target_dir):
-        print(f"Source directory: {source_dir}")
-        print(f"Target directory: {target_dir}")
-        print("Source or target directory does not exist.")
-        return results
-    
-    source_files = [f for f in os.listdir(source_dir) if f.endswith('.py')]
-    
-    for source_file in source_files:
-        source_path = os.path.join(source_dir, source_file)
-        file_name = os.path.splitext(source_file)[0]
-        target_subdir = os.path.join(target_dir, file_name)
-        
-        if not os.path.exists(target_subdir):
-            print(f"Target subfolder {target_subdir} does not exist. Skipping {source_file}.")
+def init_scorer(lang, weights, engine="full", gate=False, instrumented=False, profile_options=None):
+    instrument.enable(instrumented)
+    _worker["profiler"] = profiling.FileProfiler(**profile_options) if profile_options else None
+    # One tree-sitter parser (or n-gram vocabulary) per worker, shared by every pair it scores.
+    _worker["engine"] = engine
+    _worker["scorer"] = NgramEngine(lang) if engine == "ngram" else CodeBLEUScorer(lang, weights)
+    _worker["reference"] = (None, None)
+    _worker["candidates"] = rename_candidates() if gate else None
+
+def reference_features(source_hash, source_code):
+    # Pairs arrive grouped by source, so remembering the last reference is
+    # enough to prepare each one once per worker.
+    cached_hash, features = _worker["reference"]
+    if cached_hash != source_hash:
+        with instrument.timed("prepare_reference"):
+            features = _worker["scorer"].prepare_reference(source_code)
+        _worker["reference"] = (source_hash, features)
+    return features
+
+def gate_batch(batch):
+    """Split off the pairs whose variant fails the static validity checks, as error results."""
+    if _worker["candidates"] is None:
+        return batch, []
+    kept = []
+    rejected = []
+    for pair in batch:
+        key, source_code, target_code, _ = pair
+        start = time.perf_counter()
+        with instrument.timed("validity", file=key[1]):
+            report = check_variant(source_code, target_code, key[1], _worker["candidates"])
+        if report["valid"]:
+            kept.append(pair)
+        else:
+            rejected.append((key, None, "invalid variant: " + "; ".join(report["errors"]), time.perf_counter() - start))
+    return kept, rejected
+
+def score_batch(batch):
+    """Pool task: (scored pairs, instrumentation records, profiled pairs) for one batch.
+
+    The batch holds (key, source_code, target_code, cached) tuples; pairs with
+    a cached result are only here to be gated and are passed back unscored.
+    """
+    batch, rejected = gate_batch(batch)
+    rejected += [(key, cached, None, None) for key, _, _, cached in batch if cached is not None]
+    batch = [(key, source_code, target_code) for key, source_code, target_code, cached in batch if cached is None]
+    profiler = _worker["profiler"]
+    if not batch:
+        scored = []
+    elif profiler is None:
+        scored = score_checked(batch)
+    elif _worker["engine"] == "ngram":
+        # Vectorized over the batch, so the batch is the unit that gets profiled.
+        with profiler.measure(f"{len(batch)} pairs from {batch[0][0][1]} to {batch[-1][0][1]}"):
+            scored = score_checked(batch)
+    else:
+        scored = [result for pair in batch for result in profile_pair(profiler, pair)]
+    return rejected + scored, instrument.drain(), profiler.drain() if profiler is not None else []
+
+def profile_pair(profiler, pair):
+    with profiler.measure(f"{pair[0][0]} vs {pair[0][1]}"):
+        return score_checked([pair])
+
+def score_checked(batch):
+    if _worker["engine"] == "ngram":
+        try:
+            start = time.perf_counter()
+            with instrument.timed("ngram_score", len(batch)):
+                results = _worker["scorer"].score_all([source for _, source, _ in batch],
+                                                      [target for _, _, target in batch])
+            seconds = (time.perf_counter() - start) / len(batch)
+            return [(key, result, None, seconds) for (key, _, _), result in zip(batch, results)]
+        except Exception:
+            if len(batch) == 1:
+                raise
+            # Fall back to one pair at a time to find the bad one.
+            return [scored for pair in batch for scored in score_isolated(pair)]
+
+    # Scored pair by pair so one bad pair does not sink the rest of the batch.
+    scored = []
+    for key, source_code, target_code in batch:
+        start = time.perf_counter()
+        try:
+            reference = reference_features(key[2], source_code)
+            with instrument.timed("calc_codebleu", file=key[1]):
+                result = _worker["scorer"].score(reference, target_code)
+            scored.append((key, result, None, time.perf_counter() - start))
+        except Exception as e:
+            scored.append((key, None, str(e), time.perf_counter() - start))
+    return scored
+
+def score_isolated(pair):
+    try:
+        return score_checked([pair])
+    except Exception as e:
+        return [(pair[0], None, str(e), 0.0)]
+
+def batched(items, batch_size):
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def score_pairs(pairs, lang, weights, workers=1, batch_size=32, window=None, engine="full", gate=False,
+                profile_options=None):
+    """Yield (key, result, error, seconds) for every (key, source_code, target_code, cached) in ``pairs``.
+
+    Pairs that already carry a ``cached`` result are passed straight through,
+    with ``seconds`` None, rather than queued behind the batches in flight, so
+    with several workers results do not come back in input order. With
+    ``gate`` the workers reject variants that fail the static validity checks
+    instead of scoring them; cached pairs then go through the workers too, so
+    the verdict does not depend on what is in the cache. With ``profile_options`` (FileProfiler keyword
+    arguments) every pair is profiled and the slow ones land in PROFILED.
+    """
+    if profile_options:
+        profiling.clear_profiles(profile_options["profile_dir"])
+    if workers == 1:
+        init_scorer(lang, weights, engine, gate, instrument.enabled(), profile_options)
+        executor = None
+    else:
+        workers = workers or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_scorer,
+                                       initargs=(lang, weights, engine, gate, instrument.enabled(), profile_options))
+    window = window or 4 * workers
+    in_flight = deque()
+
+    def unpack(returned):
+        scored, timings, profiled = returned
+        instrument.merge(timings)
+        PROFILED.extend(profiled)
+        return scored
+
+    def submit(batch):
+        if executor is None:
+            yield from unpack(score_batch(batch))
+            return
+        in_flight.append(executor.submit(score_batch, batch))
+        if len(in_flight) >= window:
+            yield from unpack(in_flight.popleft().result())
+
+    batch = []
+    try:
+        for key, source_code, target_code, cached in pairs:
+            if cached is not None and not gate:
+                yield key, cached, None, None
+                continue
+            batch.append((key, source_code, target_code, cached))
+            if len(batch) == batch_size:
+                yield from submit(batch)
+                batch = []
+        if batch:
+            yield from submit(batch)
+        while in_flight:
+            yield from unpack(in_flight.popleft().result())
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        elif _worker["profiler"] is not None:
+            _worker["profiler"].flush()
+
+def collect_pairs(source_dir, target_dir):
+    index = CorpusIndex(source_dir, target_dir)
+
+    for source_file in index.sources:
+        variants = index.variants(source_file)
+        if variants is None:
+            print(f"Target subfolder {index.variant_dir(source_file)} does not exist. Skipping {source_file}.")
             continue
-        
-        source_code = read_file(source_path)
+
+        source_code = read_file(index.source_path(source_file))
         if not source_code or not source_code.strip():
             print(f"Skipping {source_file} due to read error or empty content.")
             continue
-        
-        results[source_file] = {}
-        
-        refactored_prefixes = [f"PipNo_{i}_" for i in range(1, 5)]
-        
-        for prefix in refactored_prefixes:
-            target_file = f"{prefix}{source_file}"
-            target_path = os.path.join(target_subdir, target_file)
-            
-            if not os.path.exists(target_path):
-                print(f"Target file {target_path} does not exist. Skipping.")
-                continue
-            
+
+        source_hash = content_hash(source_code)
+
+        for _, target_module, target_path in variants:
+            target_file = f"{target_module}.py"
             target_code = read_file(target_path)
             if not target_code or not target_code.strip():
                 print(f"Skipping {target_file} due to read error or empty content.")
                 continue
 
+            yield (source_file, target_file, source_hash, content_hash(target_code)), source_code, target_code
+
+def lookup_cached(pairs, cache, lang, weights):
+    # Resolve cached scores a chunk at a time; misses go on with cached=None.
+    for chunk in batched(pairs, LOOKUP_CHUNK):
+        cached = cache.get_many([(key[2], key[3]) for key, _, _ in chunk], lang, weights)
+        for key, source_code, target_code in chunk:
+            yield key, source_code, target_code, cached.get((key[2], key[3]))
+
+def share_twins(pairs, twins):
+    """Pass on one uncached pair per (source, variant AST fingerprint).
+
+    Variants are unparsed ASTs, so an equal fingerprint means equal code and
+    an equal score. The keys of the held-back twins are collected in
+    ``twins`` under the key of the pair that is scored for them.
+    """
+    for _, group in itertools.groupby(pairs, key=lambda pair: pair[0][0]):
+        group = list(group)
+        scored = {}
+        held = set()
+        for key, _, target_code, cached in group:
+            if cached is not None:
+                continue
             try:
-                result = calc_codebleu(
-                    references=[source_code],
-                    predictions=[target_code],
-                    lang=lang,
-                    weights=weights,
-                    tokenizer=None
-                )
-                results[source_file][target_file] = result
-            except Exception as e:
-                print(f"Error processing {source_file} vs {target_file}: {e}")
-    
-    return results
+                variant_fingerprint = fingerprint(target_code)
+            except (SyntaxError, ValueError):
+                continue
+            if variant_fingerprint in scored:
+                twins.setdefault(scored[variant_fingerprint], []).append(key)
+                held.add(key)
+            else:
+                scored[variant_fingerprint] = key
+        for pair in group:
+            if pair[0] not in held:
+                yield pair
+
+def iter_scores(source_dir, target_dir, lang="python", weights=(0.25, 0.25, 0.25, 0.25), cache=None,
+                workers=1, batch_size=32, engine="full", gate=False, profile_options=None):
+    """Yield one result row per (source, PipNo variant) pair as soon as it is scored."""
+    if not os.path.exists(source_dir) or not os.path.exists(target_dir):
+        print(f"Source directory: {source_dir}")
+        print(f"Target directory: {target_dir}")
+        print("Source or target directory does not exist.")
+        return
+
+    if engine != "full":
+        # The score cache only holds complete CodeBLEU results.
+        cache = None
+    pairs = collect_pairs(source_dir, target_dir)
+    if cache is not None:
+        pairs = lookup_cached(pairs, cache, lang, weights)
+    else:
+        pairs = ((key, source_code, target_code, None) for key, source_code, target_code in pairs)
+    twins = {}
+    pairs = share_twins(pairs, twins)
+    try:
+        for key, result, error, seconds in score_pairs(pairs, lang, weights, workers, batch_size, engine=engine, gate=gate,
+                                                       profile_options=profile_options):
+            for key, seconds in [(key, seconds)] + [(twin, 0.0) for twin in twins.pop(key, [])]:
+                source_file, target_file, source_hash, target_hash = key
+                if error is not None:
+                    print(f"Error processing {source_file} vs {target_file}: {error}")
+                elif cache is not None and seconds is not None:
+                    cache.add(source_hash, target_hash, lang, weights, result)
+                yield dict(result or {}, source=source_file, target=target_file,
+                           pipeline="_".join(target_file.split("_")[:2]), source_sha=source_hash,
+                           target_sha=target_hash, engine=engine, cached=seconds is None,
+                           seconds=seconds, error=error)
+    finally:
+        if cache is not None:
+            cache.flush()
+
+def compare_code_files(source_dir, target_dir, lang="python", weights=(0.25, 0.25, 0.25, 0.25), cache=None,
+                       workers=1, batch_size=32, engine="full", gate=False, profile_options=None):
+    results = {}
+    for row in iter_scores(source_dir, target_dir, lang, weights, cache, workers, batch_size, engine, gate,
+                           profile_options):
+        if row["error"] is None:
+            results.setdefault(row["source"], {})[row["target"]] = {metric: row[metric] for metric, _ in METRIC_LABELS
+                                                                    if metric in row}
+    # Scores can arrive out of order from the pool; report them by source and pipeline number.
+    return {source: dict(sorted(targets.items(), key=lambda item: int(VARIANT_PATTERN.match(item[0]).group(1))))
+            for source, targets in sorted(results.items())}
+
+def stream_scores(sink, source_dir, target_dir, lang="python", weights=(0.25, 0.25, 0.25, 0.25), cache=None,
+                  workers=1, batch_size=32, engine="full", gate=False, profile_options=None):
+    """Write every result row to ``sink`` as it arrives; nothing is kept in memory."""
+    scored = failed = 0
+    for row in iter_scores(source_dir, target_dir, lang, weights, cache, workers, batch_size, engine, gate,
+                           profile_options):
+        sink.write(row)
+        scored += 1
+        failed += row["error"] is not None
+    return {"pairs": scored, "failed": failed}
 
 def write_to_txt(results, filename="codebleu_results.txt"):
     with open(filename, 'w', encoding='utf-8') as f:
@@ -71,23 +327,74 @@ def write_to_txt(results, filename="codebleu_results.txt"):
             for source_file, target_results in results.items():
                 for target_file, metrics in target_results.items():
                     f.write(f"Result -  {source_file} : {target_file}\n")
-                    f.write(f"CodeBLEU Score: {metrics['codebleu']:.4f}\n")
-                    f.write(f"N-gram Match: {metrics['ngram_match_score']:.4f}\n")
-                    f.write(f"Weighted N-gram Match: {metrics['weighted_ngram_match_score']:.4f}\n")
-                    f.write(f"Syntax Match (AST): {metrics['syntax_match_score']:.4f}\n")
-                    f.write(f"Dataflow Match: {metrics['dataflow_match_score']:.4f}\n\n")
+                    # The n-gram engine only reports its two components.
+                    for metric, label in METRIC_LABELS:
+                        if metric in metrics:
+                            f.write(f"{label}: {metrics[metric]:.4f}\n")
+                    f.write("\n")
         else:
             f.write("No code pairs.\n")
 
 def main():
+    parser = argparse.ArgumentParser(description="Score every PipNo variant against its source with CodeBLEU.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Scoring processes; 0 means one per CPU (default: 1, in-process)")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Pairs sent to a worker at a time (default: 32, or 4096 with --engine ngram)")
+    parser.add_argument("--engine", choices=ENGINES, default="full",
+                        help="full: all CodeBLEU components; ngram: vectorized n-gram components only")
+    parser.add_argument("--validate", type=int, default=0, metavar="N",
+                        help="Compare the ngram engine with calc_codebleu on N sampled pairs and exit")
+    parser.add_argument("--skip-invalid", action="store_true",
+                        help="Report variants that fail the static validity checks as errors instead of scoring them")
+    parser.add_argument("--output", default="codebleu_results.txt",
+                        help="A .txt report, or a .csv/.jsonl file or .parquet directory with one row per pair")
+    parser.add_argument("--append", action="store_true", help="Add rows to an existing CSV/JSONL/Parquet output")
+    parser.add_argument("--flush-every", type=int, default=1000, help="Rows buffered before each flush")
+    parser.add_argument("--score-cache", default=DEFAULT_SCORE_CACHE,
+                        help="SQLite score cache, relative to this script (empty string disables it)")
+    instrument.add_argument(parser)
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.enable(args.instrument is not None)
+    profile_options = profiling.options_from(args)
+
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    
+
     source_dir = os.path.join(script_dir, "source")
     target_dir = os.path.join(script_dir, "target")
-    
-    results = compare_code_files(source_dir, target_dir)
-    
-    write_to_txt(results, "codebleu_results.txt")
+
+    if args.validate:
+        pairs = [(source_code, target_code) for _, source_code, target_code in collect_pairs(source_dir, target_dir)]
+        for metric, report in validate(pairs, args.validate).items():
+            print(f"{metric}: {report['pairs']} pairs, max |error| {report['max_abs_error']:.3g}, "
+                  f"mean |error| {report['mean_abs_error']:.3g}")
+        return
+
+    batch_size = args.batch_size or DEFAULT_BATCH_SIZES[args.engine]
+    cache = ScoreCache(os.path.join(script_dir, args.score_cache)) if args.score_cache and args.engine == "full" else None
+    try:
+        if args.output.lower().endswith(".txt"):
+            results = compare_code_files(source_dir, target_dir, cache=cache, workers=args.workers,
+                                         batch_size=batch_size, engine=args.engine, gate=args.skip_invalid,
+                                         profile_options=profile_options)
+            write_to_txt(results, args.output)
+        else:
+            with ResultSink(args.output, args.flush_every, args.append) as sink:
+                stats = stream_scores(sink, source_dir, target_dir, cache=cache, workers=args.workers,
+                                      batch_size=batch_size, engine=args.engine, gate=args.skip_invalid,
+                                      profile_options=profile_options)
+            print(f"Wrote {stats['pairs']} rows ({stats['failed']} failed) to {args.output} "
+                  f"[{detect_format(args.output)}]")
+    finally:
+        if cache is not None:
+            cache.close()
+    if cache is not None:
+        print(f"Score cache: {cache.hits} hits, {cache.misses} misses")
+    if args.instrument:
+        instrument.report(args.instrument)
+    if profile_options:
+        profiling.report(args.profile_dir, PROFILED, args.profile_top)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,148 @@
+import math
+from collections import Counter
+
+from codebleu.bleu import brevity_penalty
+from codebleu.codebleu import PACKAGE_DIR
+from codebleu.dataflow_match import dfg_function, get_data_flow, normalize_dataflow
+from codebleu.parser import remove_comments_and_docstrings
+from codebleu.utils import get_tree_sitter_language, ngrams
+from tree_sitter import Parser
+
+NGRAM_ORDERS = (1, 2, 3, 4)
+BLEU_WEIGHTS = (0.25, 0.25, 0.25, 0.25)
+SMOOTHING_EPSILON = 0.1
+KEYWORD_WEIGHT = 1
+TOKEN_WEIGHT = 0.2
+# codebleu's weighted n-gram match measures the length of each reference as
+# the [tokens, weights] pair it is stored in, so its brevity penalty always
+# sees a reference of length 2.
+WEIGHTED_REFERENCE_LENGTH = 2
+
+
+def tokenize(code):
+    return code.strip().split()
+
+
+def ngram_counts(tokens):
+    return [Counter(ngrams(tokens, n)) if len(tokens) >= n else Counter() for n in NGRAM_ORDERS]
+
+
+def bleu_from_counts(numerators, denominators, ref_len, hyp_len):
+    # Same arithmetic as codebleu's corpus_bleu for a single pair, including
+    # its epsilon smoothing of empty orders.
+    if numerators[0] == 0:
+        return 0
+    bp = brevity_penalty(ref_len, hyp_len)
+    p_n = [(num + SMOOTHING_EPSILON, den) if num == 0 else (num, den) for num, den in zip(numerators, denominators)]
+    return bp * math.exp(math.fsum(w * math.log(num / den) for w, (num, den) in zip(BLEU_WEIGHTS, p_n)))
+
+
+def subtrees(root_node):
+    # codebleu's get_all_sub_trees: every node that has children, as its s-expression.
+    stack = [root_node]
+    sexps = []
+    while stack:
+        node = stack.pop()
+        sexps.append(str(node))
+        stack.extend(child for child in node.children if child.children)
+    return sexps
+
+
+class CodeBLEUScorer:
+    """``calc_codebleu`` for one reference against many predictions.
+
+    ``prepare_reference`` does all reference-side work once - n-gram counts,
+    keyword weights, AST subtrees and data-flow edges - and ``score`` only
+    processes the prediction. Scores match ``calc_codebleu`` called with a
+    single reference and prediction.
+    """
+
+    def __init__(self, lang="python", weights=(0.25, 0.25, 0.25, 0.25)):
+        self.lang = lang
+        self.weights = weights
+        self.parser = Parser()
+        self.parser.language = get_tree_sitter_language(lang)
+        self.dfg_parser = [self.parser, dfg_function[lang]]
+        with open(PACKAGE_DIR / "keywords" / (lang + ".txt"), 'r', encoding='utf-8') as f:
+            self.keywords = {line.strip() for line in f}
+
+    def strip_comments(self, code):
+        try:
+            return remove_comments_and_docstrings(code, self.lang)
+        except Exception:
+            return code
+
+    def dataflow(self, code):
+        return Counter((var, relation, tuple(parents))
+                       for var, relation, parents in normalize_dataflow(get_data_flow(code, self.dfg_parser)))
+
+    def prepare_reference(self, code):
+        code = code.strip()
+        tokens = tokenize(code)
+        counts = ngram_counts(tokens)
+        token_weights = {token: KEYWORD_WEIGHT if token in self.keywords else TOKEN_WEIGHT for token in tokens}
+        stripped = self.strip_comments(code)
+        return {
+            "length": len(tokens),
+            "counts": counts,
+            "token_weights": token_weights,
+            "weighted_totals": [max(1, self.weighted_sum(token_weights, counts[0]))] +
+                               [max(1, sum(order.values())) for order in counts[1:]],
+            "subtrees": subtrees(self.parser.parse(bytes(stripped, "utf8")).root_node),
+            "dataflow": self.dataflow(stripped),
+        }
+
+    @staticmethod
+    def weighted_sum(token_weights, counts):
+        total = 0
+        for ngram, count in counts.items():
+            total += count * token_weights.get(ngram[0], 1)
+        return total
+
+    def score(self, reference, prediction):
+        prediction = prediction.strip()
+        tokens = tokenize(prediction)
+        counts = ngram_counts(tokens)
+
+        matches = []
+        weighted_matches = []
+        for n, (ref_counts, hyp_counts) in enumerate(zip(reference["counts"], counts), start=1):
+            matches.append(sum(min(count, ref_counts[ngram]) for ngram, count in hyp_counts.items()))
+            if n == 1:
+                clipped = {ngram: min(count, hyp_counts[ngram]) for ngram, count in ref_counts.items()}
+                weighted_matches.append(self.weighted_sum(reference["token_weights"], clipped))
+            else:
+                weighted_matches.append(matches[-1])
+
+        ngram_match_score = bleu_from_counts(matches, [max(1, sum(order.values())) for order in counts],
+                                             reference["length"], len(tokens))
+        weighted_ngram_match_score = bleu_from_counts(weighted_matches, reference["weighted_totals"],
+                                                      WEIGHTED_REFERENCE_LENGTH, len(tokens))
+
+        stripped = self.strip_comments(prediction)
+        candidate_subtrees = set(subtrees(self.parser.parse(bytes(stripped, "utf8")).root_node))
+        syntax_match_score = (sum(1 for sexp in reference["subtrees"] if sexp in candidate_subtrees) /
+                              len(reference["subtrees"]))
+
+        ref_dataflow = reference["dataflow"]
+        if ref_dataflow:
+            candidate_dataflow = self.dataflow(stripped)
+            dataflow_match_score = (sum(min(count, candidate_dataflow[edge]) for edge, count in ref_dataflow.items()) /
+                                    sum(ref_dataflow.values()))
+        else:
+            # calc_codebleu degenerates to 0 here and then counts it as 1 in the total.
+            dataflow_match_score = 0
+
+        alpha, beta, gamma, theta = self.weights
+        return {
+            "codebleu": (alpha * ngram_match_score + beta * weighted_ngram_match_score +
+                         gamma * syntax_match_score + theta * (dataflow_match_score or 1)),
+            "ngram_match_score": ngram_match_score,
+            "weighted_ngram_match_score": weighted_ngram_match_score,
+            "syntax_match_score": syntax_match_score,
+            "dataflow_match_score": dataflow_match_score,
+        }
+
+    def score_all(self, reference_code, predictions):
+        reference = self.prepare_reference(reference_code)
+        return [self.score(reference, prediction) for prediction in predictions]
@@ -0,0 +1,194 @@
+import argparse
+import ast
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import instrument
+from generate import DEFAULT_PIPELINES, parse_pipeline_spec
+from parse_cache import clone_tree
+from pipeline import TRANSFORMERS, Pipeline
+
+OUTPUT_FIELDS = ["id", "pipeline", "code", "error"]
+
+_worker = {}
+
+
+def detect_format(path):
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def read_records(path, code_field="code", id_field="id"):
+    """Lazily yield (record_id, code, error) from a JSONL or CSV file; error is set for unreadable records."""
+    if detect_format(path) == "csv":
+        csv.field_size_limit(sys.maxsize)
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            for index, row in enumerate(csv.DictReader(f)):
+                yield row.get(id_field) or str(index), row.get(code_field) or "", None
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            for index, line in enumerate(f):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    record_id, code = record.get(id_field, str(index)), record.get(code_field) or ""
+                except (ValueError, AttributeError) as e:
+                    # Not JSON, or JSON that is not an object.
+                    yield str(index), None, f"Unreadable record on line {index + 1}: {e}"
+                    continue
+                yield record_id, code, None
+
+
+class RecordWriter:
+    def __init__(self, path, flush_every=1000):
+        self.path = path
+        self.format = detect_format(path)
+        self.flush_every = flush_every
+        self.pending = 0
+        self.file = open(path, 'w', encoding='utf-8', newline='')
+        if self.format == "csv":
+            self.writer = csv.DictWriter(self.file, fieldnames=OUTPUT_FIELDS)
+            self.writer.writeheader()
+
+    def write(self, row):
+        if self.format == "csv":
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps(row) + "\n")
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.file.flush()
+            self.pending = 0
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def init_worker(pipelines, instrumented=False):
+    instrument.enable(instrumented)
+    _worker["pipelines"] = pipelines
+
+
+def refactor_batch(batch):
+    """Pool task: (output rows, instrumentation records) for one batch of (record_id, code, error)."""
+    instrument.set_file(None)
+    with instrument.timed("refactor_batch", items=len(batch)):
+        rows = refactor_records(batch)
+    return rows, instrument.drain()
+
+
+def refactor_records(batch):
+    rows = []
+    for record_id, code, error in batch:
+        if error is not None:
+            rows.append({"id": record_id, "pipeline": None, "code": None, "error": error})
+            continue
+        instrument.set_file(record_id)
+        try:
+            with instrument.timed("parse"):
+                tree = ast.parse(code)
+        except (SyntaxError, ValueError) as e:
+            # ValueError: null bytes in the snippet.
+            rows.append({"id": record_id, "pipeline": None, "code": None, "error": f"Syntax error in source code: {e}"})
+            continue
+        for pip_no, stages in _worker["pipelines"].items():
+            row = {"id": record_id, "pipeline": f"PipNo_{pip_no}", "code": None, "error": None}
+            try:
+                # Fresh transformer instances per snippet: some keep state between calls.
+                row["code"] = Pipeline(stages).refactor_tree(clone_tree(tree))
+            except Exception as e:
+                row["error"] = f"{type(e).__name__}: {e}"
+            rows.append(row)
+    return rows
+
+
+def batched(records, batch_size):
+    iterator = iter(records)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def stream_corpus(input_path, output_path, pipelines=None, workers=None, batch_size=64, window=None,
+                  code_field="code", id_field="id"):
+    """Refactor every record of a JSONL/CSV corpus, writing variants in input order.
+
+    At most ``window`` batches are in flight at once, so memory stays bounded
+    by ``window * batch_size`` snippets regardless of corpus size.
+    """
+    pipelines = dict(pipelines or DEFAULT_PIPELINES)
+    workers = workers or os.cpu_count() or 1
+    window = window or 4 * workers
+    records = read_records(input_path, code_field, id_field)
+    count = 0
+    failed = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(pipelines, instrument.enabled())) as executor, \
+            RecordWriter(output_path) as writer:
+        in_flight = deque()
+        for batch in batched(records, batch_size):
+            while len(in_flight) >= window:
+                count, failed = drain(in_flight.popleft(), writer, count, failed)
+            in_flight.append((len(batch), executor.submit(refactor_batch, batch)))
+        while in_flight:
+            count, failed = drain(in_flight.popleft(), writer, count, failed)
+
+    elapsed = time.perf_counter() - start
+    return {"records": count, "failed": failed, "seconds": elapsed,
+            "records_per_sec": count / elapsed if elapsed else 0.0}
+
+
+def drain(entry, writer, count, failed):
+    size, future = entry
+    rows, timings = future.result()
+    instrument.merge(timings)
+    for row in rows:
+        if row["error"]:
+            failed += 1
+        writer.write(row)
+    return count + size, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refactor a JSONL/CSV corpus of code snippets.")
+    parser.add_argument("input", help="JSONL or CSV file with one snippet per row")
+    parser.add_argument("output", help="JSONL or CSV file to write variants to")
+    parser.add_argument("--code-field", default="code", help="Column/key holding the snippet")
+    parser.add_argument("--id-field", default="id", help="Column/key holding the record id")
+    parser.add_argument("--pipeline", action="append", type=parse_pipeline_spec, metavar="N=STAGE,...",
+                        help=f"Pipeline definition, repeatable. Stages: {', '.join(TRANSFORMERS)}")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Snippets sent to a worker at a time")
+    parser.add_argument("--window", type=int, default=None,
+                        help="Maximum batches in flight (default: 4 per worker)")
+    instrument.add_argument(parser)
+    args = parser.parse_args()
+    instrument.enable(args.instrument is not None)
+
+    pipelines = dict(args.pipeline) if args.pipeline else DEFAULT_PIPELINES
+    stats = stream_corpus(args.input, args.output, pipelines, args.workers, args.batch_size, args.window,
+                          args.code_field, args.id_field)
+    print(f"Refactored {stats['records']} records in {stats['seconds']:.2f}s - "
+          f"{stats['records_per_sec']:.1f} records/sec, {stats['failed']} failed variants")
+    if args.instrument:
+        instrument.report(args.instrument)
+
+
+if __name__ == "__main__":
+    main()
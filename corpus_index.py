@@ -0,0 +1,144 @@
+import argparse
+import json
+import os
+import re
+import tempfile
+
+DEFAULT_INDEX = "corpus_index.json"
+VARIANT_PATTERN = re.compile(r"^PipNo_(\d+)_(.+)\.py$")
+
+
+def directory_stamp(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def scan_variants(target_dir, base):
+    """[(pip_no, variant file), ...] in target/<base>, or None if there is no such folder."""
+    variants = []
+    try:
+        with os.scandir(os.path.join(target_dir, base)) as entries:
+            for entry in entries:
+                match = VARIANT_PATTERN.match(entry.name)
+                if match and match.group(2) == base and entry.is_file():
+                    variants.append((int(match.group(1)), entry.name))
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return sorted(variants)
+
+
+def scan(source_dir, target_dir):
+    """Walk source/ and target/ once: {source file: [(pip_no, variant file), ...] or None}."""
+    with os.scandir(source_dir) as entries:
+        source_files = sorted(entry.name for entry in entries if entry.is_file() and entry.name.endswith(".py"))
+    target_dirs = set()
+    if os.path.isdir(target_dir):
+        with os.scandir(target_dir) as entries:
+            target_dirs = {entry.name for entry in entries if entry.is_dir()}
+
+    sources = {}
+    for source_file in source_files:
+        base = os.path.splitext(source_file)[0]
+        sources[source_file] = scan_variants(target_dir, base) if base in target_dirs else None
+    return sources
+
+
+class CorpusIndex:
+    """Every source module and its PipNo_<N>_ variants, found with one scan.
+
+    The scan is saved to ``path`` (one entry per source/target directory pair)
+    and reused while neither directory has changed. Variants added to or
+    removed from an existing target/<base> folder only change that folder's
+    mtime, so every folder is stamped too and rescanned on its own when it
+    changes. ``refresh`` forces a full scan.
+    """
+
+    def __init__(self, source_dir, target_dir, path=DEFAULT_INDEX, refresh=False):
+        self.source_dir = source_dir
+        self.target_dir = target_dir
+        self.path = path
+        self.key = f"{os.path.abspath(source_dir)}|{os.path.abspath(target_dir)}"
+        self.stamps = [directory_stamp(source_dir), directory_stamp(target_dir)]
+        self.indexes = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.indexes = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable corpus index {path}: {e}")
+
+        entry = self.indexes.get(self.key)
+        if refresh or entry is None or entry["stamps"] != self.stamps or "folder_stamps" not in entry:
+            self.sources = scan(source_dir, target_dir)
+            self.folder_stamps = {source_file: self.folder_stamp(source_file) for source_file in self.sources}
+            self.record()
+            return
+
+        self.sources = {source_file: None if variants is None else [tuple(variant) for variant in variants]
+                        for source_file, variants in entry["sources"].items()}
+        self.folder_stamps = entry["folder_stamps"]
+        changed = False
+        for source_file in self.sources:
+            stamp = self.folder_stamp(source_file)
+            if stamp != self.folder_stamps.get(source_file):
+                self.sources[source_file] = scan_variants(target_dir, os.path.splitext(source_file)[0])
+                self.folder_stamps[source_file] = stamp
+                changed = True
+        if changed:
+            self.record()
+
+    def folder_stamp(self, source_file):
+        return directory_stamp(self.variant_dir(source_file))
+
+    def record(self):
+        self.indexes[self.key] = {"stamps": self.stamps, "folder_stamps": self.folder_stamps, "sources": self.sources}
+        self.save()
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".corpus_index_", suffix=".json")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.indexes, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def source_path(self, source_file):
+        return os.path.join(self.source_dir, source_file)
+
+    def variant_dir(self, source_file):
+        return os.path.join(self.target_dir, os.path.splitext(source_file)[0])
+
+    def variants(self, source_file):
+        """[(pip_no, variant module name, variant path)], or None without a target folder."""
+        variants = self.sources.get(source_file)
+        if variants is None:
+            return None
+        variant_dir = self.variant_dir(source_file)
+        return [(pip_no, os.path.splitext(name)[0], os.path.join(variant_dir, name)) for pip_no, name in variants]
+
+    def pairs(self):
+        """(source path, pip_no, variant path) for every indexed pair."""
+        for source_file in self.sources:
+            for pip_no, _, variant_path in self.variants(source_file) or []:
+                yield self.source_path(source_file), pip_no, variant_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index source modules and their PipNo variants.")
+    parser.add_argument("--source", default="source")
+    parser.add_argument("--target", default="target")
+    parser.add_argument("--index", default=DEFAULT_INDEX)
+    args = parser.parse_args()
+
+    index = CorpusIndex(args.source, args.target, args.index, refresh=True)
+    pairs = sum(len(variants or []) for variants in index.sources.values())
+    print(f"Indexed {len(index.sources)} sources and {pairs} variants into {args.index}")
+
+
+if __name__ == "__main__":
+    main()
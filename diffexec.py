@@ -0,0 +1,274 @@
+import argparse
+import contextlib
+import copy
+import importlib.util
+import inspect
+import io
+import json
+import os
+import random
+import sys
+
+import instrument
+from corpus_index import CorpusIndex
+from funcvaridentifier import VariableRefactator
+from sandbox import CPU_LIMIT, MEMORY_LIMIT, OK, CpuLimitExceeded, Sandbox
+
+SAMPLE_VALUES = [0, 1, -1, 2, 3.5, "", "abc", "hello world", b"data", [], [1, 2, 3], {}, {"a": 1}, None, True]
+MAX_DEPTH = 8
+MAX_MISMATCHES = 5
+# A CPU limit hit wins over a memory limit hit, as in variant_session.read_outcomes.
+LIMIT_SEVERITY = [OK, MEMORY_LIMIT, CPU_LIMIT]
+
+
+def load_module(name, path):
+    """Import ``path`` as module ``name`` so a source and its variants can be loaded side by side."""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    with contextlib.redirect_stdout(io.StringIO()):
+        spec.loader.exec_module(module)
+    return module
+
+
+def top_level_functions(module):
+    return {name: obj for name, obj in vars(module).items()
+            if inspect.isfunction(obj) and obj.__module__ == module.__name__}
+
+
+def rename_candidates(renames=None):
+    """{source name: [source name, every name VariableRefactator may rename it to]}."""
+    identifiers = renames if renames is not None else VariableRefactator().identifiers
+    return {old: [old] + [new for new in news if new != old] for old, news in identifiers.items()}
+
+
+def match_functions(source_functions, variant_functions, candidates):
+    """Pair each source function with its variant, following VariableRefactator renames."""
+    # Reverse table: a variant name only stands for a source name it can come from.
+    reverse = {}
+    for old, news in candidates.items():
+        for new in news:
+            reverse.setdefault(new, set()).add(old)
+    matched = {}
+    for name in source_functions:
+        for candidate in candidates.get(name, [name]):
+            if candidate in variant_functions and (candidate == name or name in reverse.get(candidate, ())):
+                matched[name] = candidate
+                break
+    return matched
+
+
+def positional_arity(function):
+    """Required positional parameters: the arguments a caller of the source has to pass.
+
+    Parameters AddDefaultArgValue appends all have defaults, so calling a
+    variant with the source's arity leaves them at the lifted constants.
+    """
+    try:
+        parameters = inspect.signature(function).parameters.values()
+    except (TypeError, ValueError):
+        return 0
+    return sum(1 for p in parameters
+               if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD) and p.default is p.empty)
+
+
+def generate_inputs(function, samples, seed):
+    rng = random.Random(seed)
+    arity = positional_arity(function)
+    if arity == 0:
+        return [()]
+    calls = {}
+    for _ in range(samples):
+        args = tuple(rng.choice(SAMPLE_VALUES) for _ in range(arity))
+        calls.setdefault(repr(args), args)
+    return list(calls.values())
+
+
+def normalize(value, depth=0):
+    # Values from different modules never compare equal as objects (each
+    # module defines its own classes), so compare their structure instead.
+    if depth > MAX_DEPTH:
+        return "..."
+    if isinstance(value, (float, complex)) and value != value:
+        # NaN never equals itself, so identical results would always mismatch.
+        return (type(value).__name__, "nan")
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__, [normalize(item, depth + 1) for item in value])
+    if isinstance(value, (set, frozenset)):
+        return (type(value).__name__, sorted(repr(normalize(item, depth + 1)) for item in value))
+    if isinstance(value, dict):
+        return ("dict", sorted((repr(normalize(k, depth + 1)), repr(normalize(v, depth + 1))) for k, v in value.items()))
+    if inspect.isfunction(value) or inspect.ismethod(value) or inspect.isclass(value):
+        return (type(value).__name__,)
+    if hasattr(value, "__dict__"):
+        return (type(value).__qualname__, normalize(vars(value), depth + 1))
+    return (type(value).__qualname__,)
+
+
+def call(function, args, seed):
+    """Run one call; returns (outcome, value, arguments after the call).
+
+    A call that runs out of the sandbox CPU budget or address space ends as
+    ("limit", "cpu_limit" or "memory_limit", None); the CPU budget is renewed,
+    so the remaining calls of the variant still run.
+    """
+    args = copy.deepcopy(args)
+    random.seed(seed)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = function(*args)
+        return "return", normalize(result), normalize(list(args))
+    except CpuLimitExceeded:
+        return "limit", CPU_LIMIT, None
+    except MemoryError:
+        return "limit", MEMORY_LIMIT, None
+    except Exception as e:
+        # Messages can mention renamed identifiers; the exception type is what has to match.
+        return "raise", type(e).__name__, normalize(list(args))
+
+
+def compare_function(source_function, variant_function, inputs, seed):
+    """Status match, mismatch, or the sandbox limit (cpu_limit, memory_limit) a call of either side hit."""
+    mismatches = []
+    limit = OK
+    for args in inputs:
+        expected = call(source_function, args, seed)
+        actual = call(variant_function, args, seed)
+        hits = [outcome[1] for outcome in (expected, actual) if outcome[0] == "limit"]
+        if hits:
+            # Calls that did not finish cannot be compared.
+            limit = max([limit] + hits, key=LIMIT_SEVERITY.index)
+        elif expected != actual:
+            mismatches.append({"args": repr(args), "source": repr(expected), "variant": repr(actual),
+                               "mutation_only": expected[:2] == actual[:2]})
+    if limit != OK:
+        status = limit
+    else:
+        status = "match" if not mismatches else "mismatch"
+    return {"calls": len(inputs), "mismatches": len(mismatches), "examples": mismatches[:MAX_MISMATCHES],
+            "status": status}
+
+
+def compare_modules(source_module, variant_module, inputs=None, samples=20, seed=0, candidates=None):
+    """Call every top-level function of the source and its variant on the same inputs.
+
+    ``inputs`` maps a source function name to recorded argument tuples;
+    functions without recorded inputs get ``samples`` generated ones.
+    Returns {source function: result} with a status of match, mismatch,
+    missing (no variant function found), cpu_limit or memory_limit.
+    """
+    inputs = inputs or {}
+    candidates = candidates if candidates is not None else rename_candidates()
+    source_functions = top_level_functions(source_module)
+    variant_functions = top_level_functions(variant_module)
+    matched = match_functions(source_functions, variant_functions, candidates)
+
+    results = {}
+    for name, source_function in source_functions.items():
+        if name not in matched:
+            results[name] = {"variant_function": None, "calls": 0, "mismatches": 0, "examples": [],
+                             "status": "missing"}
+            continue
+        calls = [tuple(args) for args in inputs[name]] if name in inputs else generate_inputs(source_function,
+                                                                                            samples, seed)
+        results[name] = {"variant_function": matched[name],
+                         **compare_function(source_function, variant_functions[matched[name]], calls, seed)}
+    return results
+
+
+def variant_report(source_module, variant_name, variant_path, inputs, samples, seed, candidates):
+    try:
+        variant_module = load_module(variant_name, variant_path)
+    except Exception as e:
+        return {"equivalent": False, "outcome": OK, "error": f"{type(e).__name__}: {e}", "functions": {}}
+    functions = compare_modules(source_module, variant_module, inputs, samples, seed, candidates)
+    outcome = max([OK] + [result["status"] for result in functions.values() if result["status"] in LIMIT_SEVERITY],
+                  key=LIMIT_SEVERITY.index)
+    return {"equivalent": outcome == OK and all(result["status"] == "match" for result in functions.values()),
+            "outcome": outcome, "error": None, "functions": functions}
+
+
+def check_variants(source_name, source_path, variants, inputs=None, samples=20, seed=0):
+    """{variant name: {"equivalent": bool, "functions": per-function results}} for one source module, in-process."""
+    source_module = load_module(source_name, source_path)
+    candidates = rename_candidates()
+    return {variant_name: variant_report(source_module, variant_name, variant_path, inputs, samples, seed, candidates)
+            for variant_name, variant_path in variants}
+
+
+def check_variant(source_dir, source_name, source_path, variant_name, variant_path, inputs, samples, seed):
+    """Sandbox task: (report, instrumentation records) for one variant against a freshly loaded source module."""
+    if source_dir not in sys.path:
+        sys.path.insert(0, source_dir)
+    with instrument.timed("diffexec", file=variant_path):
+        source_module = load_module(source_name, source_path)
+        report = variant_report(source_module, variant_name, variant_path, inputs, samples, seed, rename_candidates())
+    return report, instrument.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Differential execution of source modules against their PipNo variants.")
+    parser.add_argument("--source", default="source")
+    parser.add_argument("--target", default="target")
+    parser.add_argument("--inputs", default=None,
+                        help="JSON file of recorded inputs: {module: {function: [[arg, ...], ...]}}")
+    parser.add_argument("--samples", type=int, default=20, help="Generated calls per function without recorded inputs")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="diffexec_results.json")
+    parser.add_argument("--workers", type=int, default=None, help="Sandbox worker processes (default: CPU count)")
+    parser.add_argument("--memory-mb", type=int, default=1024, help="Address-space limit per sandbox worker (0 disables)")
+    parser.add_argument("--cpu-seconds", type=int, default=30, help="CPU time allowed per variant (0 disables)")
+    parser.add_argument("--timeout", type=float, default=60, help="Wall-clock seconds allowed per variant (0 disables)")
+    instrument.add_argument(parser)
+    args = parser.parse_args()
+    instrument.enable(args.instrument is not None)
+
+    recorded = {}
+    if args.inputs:
+        with open(args.inputs, 'r', encoding='utf-8') as f:
+            recorded = json.load(f)
+
+    index = CorpusIndex(args.source, args.target)
+    source_dir = os.path.abspath(index.source_dir)
+    tasks = []
+    for source_file in index.sources:
+        module_name = source_file[:-3]
+        for _, variant_name, variant_path in index.variants(source_file) or []:
+            tasks.append((source_dir, module_name, os.path.abspath(index.source_path(source_file)), variant_name,
+                          os.path.abspath(variant_path), recorded.get(module_name), args.samples, args.seed))
+
+    with Sandbox(workers=args.workers or os.cpu_count() or 1, memory_mb=args.memory_mb,
+                 cpu_seconds=args.cpu_seconds, wall_seconds=args.timeout) as sandbox:
+        outcomes = sandbox.map(check_variant, tasks)
+
+    results = {}
+    for task, (outcome, value) in zip(tasks, outcomes):
+        module_name, variant_name = task[1], task[3]
+        if outcome == OK:
+            report, timings = value
+            instrument.merge(timings)
+        else:
+            report = {"equivalent": False, "outcome": outcome, "error": value, "functions": {}}
+        results.setdefault(module_name, {})[variant_name] = report
+        if report["outcome"] != OK:
+            limited = [name for name, result in report["functions"].items() if result["status"] == report["outcome"]]
+            print(f"{variant_name}: {report['outcome'].upper()}" + (f" {report['error']}" if report["error"] else "")
+                  + (f" ({', '.join(limited)})" if limited else ""))
+        elif report["error"]:
+            print(f"{variant_name}: ERROR {report['error']}")
+        else:
+            failing = [name for name, result in report["functions"].items() if result["status"] != "match"]
+            print(f"{variant_name}: {'EQUIVALENT' if report['equivalent'] else 'DIFFERS'}"
+                  + (f" ({', '.join(failing)})" if failing else ""))
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=1)
+    print(f"Results written to {args.output}")
+    if args.instrument:
+        instrument.report(args.instrument)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import ast
+
+from hashing import content_hash
+
+
+class AlphaRenamer(ast.NodeTransformer):
+    """Renames every name the module binds to _0, _1, ... in order of first binding.
+
+    Functions, classes, parameters and assigned names are bound; imports,
+    attributes and builtins keep their names, as do keyword arguments that
+    do not name a renamed parameter.
+    """
+
+    def __init__(self):
+        self.names = {}
+
+    def bind(self, name):
+        if name not in self.names:
+            self.names[name] = f"_{len(self.names)}"
+        return self.names[name]
+
+    def collect(self, tree):
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                self.bind(node.name)
+            elif isinstance(node, ast.arg):
+                self.bind(node.arg)
+            elif isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+                self.bind(node.id)
+        return self
+
+    def rename(self, name):
+        return self.names.get(name, name)
+
+    def visit_FunctionDef(self, node):
+        node.name = self.rename(node.name)
+        return self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+    visit_ClassDef = visit_FunctionDef
+
+    def visit_arg(self, node):
+        node.arg = self.rename(node.arg)
+        return self.generic_visit(node)
+
+    def visit_Name(self, node):
+        node.id = self.rename(node.id)
+        return node
+
+    def visit_keyword(self, node):
+        if node.arg is not None:
+            node.arg = self.rename(node.arg)
+        return self.generic_visit(node)
+
+    def visit_Global(self, node):
+        node.names = [self.rename(name) for name in node.names]
+        return node
+
+    visit_Nonlocal = visit_Global
+
+
+def tree_fingerprint(tree, alpha=False):
+    """sha256 of the tree's dump without positions; ``alpha`` renames bound names first.
+
+    The tree is modified in place when ``alpha`` is set.
+    """
+    if alpha:
+        tree = AlphaRenamer().collect(tree).visit(tree)
+    return content_hash(("alpha:" if alpha else "exact:") + ast.dump(tree, annotate_fields=False))
+
+
+def fingerprint(code, alpha=False):
+    """Canonical fingerprint of ``code``: equal for code that only differs in formatting and comments."""
+    return tree_fingerprint(ast.parse(code), alpha)
+
+
+def file_fingerprint(path, alpha=False):
+    with open(path, 'r', encoding='utf-8') as f:
+        return fingerprint(f.read(), alpha)
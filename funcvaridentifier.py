@@ -115,6 +115,8 @@ class FuncVarNameRefactator:
 import ast
 import random
 
+from hashing import variant_seed
+
 class VariableRefactator:
     def __init__(self):
         self.code_identifiers = [
@@ -142,6 +144,11 @@ class VariableRefactator:
         except SyntaxError as e:
             raise ValueError(f"Syntax error in source code: {e}")
 
+        tree = self.mutate_tree(tree)
+        ast.fix_missing_locations(tree)
+        return ast.unparse(tree)
+
+    def mutate_tree(self, tree):
         self.old_names = {}
 
         # First pass: Identify and rename function definitions, parameters, and variables
@@ -176,8 +183,71 @@ class VariableRefactator:
             if isinstance(node, ast.Name) and node.id in self.old_names:
                 node.id = self.old_names[node.id]
 
-        ast.fix_missing_locations(tree)
-        return ast.unparse(tree)
+        return tree
+
+    def transform_tree(self, tree):
+        return self.mutate_tree(tree)
+
+    def collect_rename_sites(self, tree):
+        # Same order and conditions as the first pass of mutate_tree; each site
+        # is (node, attribute, old name) and draws one random.choice.
+        sites = []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.FunctionDef):
+                if node.name in self.identifiers:
+                    sites.append((node, "name", node.name))
+                for param in node.args.args:
+                    if param.arg in self.code_identifiers and param.arg in self.identifiers:
+                        sites.append((param, "arg", param.arg))
+            elif isinstance(node, ast.Assign):
+                for target in node.targets:
+                    if isinstance(target, ast.Name) and target.id in self.code_identifiers and target.id in self.identifiers:
+                        sites.append((target, "id", target.id))
+        return sites
+
+    def generate_variants(self, source_code, k, seed=0):
+        """Return ``k`` renamed variants as ``(variant_seed, code)`` pairs from one parse.
+
+        Rename sites and the Name nodes they can affect are collected once;
+        each variant draws its rename table, applies it, unparses and restores.
+        Variant ``i`` equals ``mutate_code`` run after
+        ``random.seed(variant_seed(seed, i))``.
+        """
+        if isinstance(source_code, bytes):
+            source_code = source_code.decode("utf-8")
+        try:
+            tree = ast.parse(source_code)
+        except SyntaxError as e:
+            raise ValueError(f"Syntax error in source code: {e}")
+
+        sites = self.collect_rename_sites(tree)
+        site_targets = {id(node) for node, attr, _ in sites if attr == "id"}
+        # Only names that start as an identifier key, or are renamed targets, can
+        # match a rename table key in the second pass.
+        names = [
+            (node, node.id) for node in ast.walk(tree)
+            if isinstance(node, ast.Name) and (node.id in self.identifiers or id(node) in site_targets)
+        ]
+
+        variants = []
+        for index in range(k):
+            current_seed = variant_seed(seed, index)
+            rng = random.Random(current_seed)
+            self.old_names = {}
+            for node, attr, old_name in sites:
+                new_name = rng.choice(self.identifiers[old_name])
+                self.old_names[old_name] = new_name
+                setattr(node, attr, new_name)
+            for node, _ in names:
+                if node.id in self.old_names:
+                    node.id = self.old_names[node.id]
+            variants.append((current_seed, ast.unparse(tree)))
+
+            for node, attr, old_name in sites:
+                setattr(node, attr, old_name)
+            for node, original_id in names:
+                node.id = original_id
+        return variants
 
     def get_refactored_code(self, source_code):
         try:
@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import instrument
+import profiling
+from corpus_index import DEFAULT_INDEX, CorpusIndex
+from fingerprint import fingerprint, tree_fingerprint
+from hashing import content_hash, variant_seed
+from manifest import DEFAULT_MANIFEST, Manifest, inputs_digest, module_source_hash
+from parse_cache import DEFAULT_CACHE_DIR, ParseCache
+from pipeline import TRANSFORMERS, Pipeline
+
+DEFAULT_PIPELINES = {
+    1: ("partials", "lambda"),
+    2: ("default_args", "assertions"),
+    3: ("parameters", "reorder"),
+    4: ("variables", "shuffle"),
+}
+MANIFEST_STAGE = "generate"
+
+_worker = {}
+
+
+def parse_pipeline_spec(spec):
+    # "3=default_args,assertions" -> (3, ("default_args", "assertions"))
+    number, _, stages = spec.partition("=")
+    names = tuple(name.strip() for name in stages.split(",") if name.strip())
+    if not number.isdigit() or not names:
+        raise argparse.ArgumentTypeError(f"Invalid pipeline spec {spec!r}, expected N=stage1,stage2")
+    unknown = [name for name in names if name not in TRANSFORMERS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown transformer(s) {', '.join(unknown)} in {spec!r}")
+    return int(number), names
+
+
+def pipeline_digest(stages, seed):
+    # Covers the pipeline config, the source of every transformer module it
+    # uses (and of the engine itself) and the seed.
+    module_hashes = [module_source_hash(TRANSFORMERS[stage]) for stage in stages]
+    return inputs_digest(",".join(stages), module_source_hash(Pipeline), *module_hashes, seed)
+
+
+def variant_path(target_dir, source_file, pip_no):
+    base = os.path.splitext(os.path.basename(source_file))[0]
+    return os.path.normpath(os.path.join(target_dir, base, f"PipNo_{pip_no}_{base}.py"))
+
+
+def write_atomic(file_path, content):
+    directory = os.path.dirname(file_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".py")
+    try:
+        with instrument.timed("write"), os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def init_worker(pipelines, target_dir, cache_dir, seed=0, digests=None, instrumented=False, profile_options=None):
+    instrument.enable(instrumented)
+    _worker["profiler"] = profiling.FileProfiler(**profile_options) if profile_options else None
+    _worker["pipelines"] = pipelines
+    _worker["target_dir"] = target_dir
+    _worker["parse_cache"] = ParseCache(cache_dir)
+    _worker["seed"] = seed
+    _worker["digests"] = digests or {}
+
+
+def process_file(task):
+    """Refactor one source file; ``task`` is (source_file, {output: previous input digest}).
+
+    Returns (source_file, written, skipped, errors, manifest records, instrumentation records,
+    profiled files).
+    """
+    instrument.set_file(task[0])
+    profiler = _worker["profiler"]
+    with instrument.timed("refactor_file"):
+        if profiler is None:
+            result = refactor_file(task)
+        else:
+            with profiler.measure(task[0]):
+                result = refactor_file(task)
+    return result + (instrument.drain(), profiler.drain() if profiler is not None else [])
+
+
+def refactor_file(task):
+    source_file, previous = task
+    written = 0
+    skipped = 0
+    errors = []
+    records = {}
+    try:
+        with instrument.timed("read"), open(source_file, 'r', encoding='utf-8') as f:
+            source_code = f.read()
+    except Exception as e:
+        return source_file, written, skipped, [(None, f"{type(e).__name__}: {e}")], records
+
+    source_hash = content_hash(source_code)
+    source_fingerprint = None
+    for pip_no, stages in _worker["pipelines"].items():
+        output_path = variant_path(_worker["target_dir"], source_file, pip_no)
+        digest = inputs_digest(source_hash, _worker["digests"].get(pip_no))
+        if previous.get(output_path) == digest and os.path.exists(output_path):
+            skipped += 1
+            continue
+        try:
+            tree = _worker["parse_cache"].parse(source_code, filename=source_file)
+            if source_fingerprint is None:
+                source_fingerprint = tree_fingerprint(tree)
+            random.seed(variant_seed(_worker["seed"], f"{os.path.basename(source_file)}:{pip_no}"))
+            # Fresh transformer instances per file: some keep state between calls.
+            code = Pipeline(stages).refactor_tree(tree)
+            write_atomic(output_path, code)
+            records[output_path] = {"inputs": digest, "source": source_file, "pipeline": pip_no,
+                                    "fingerprint": fingerprint(code), "alpha_fingerprint": fingerprint(code, alpha=True),
+                                    "source_fingerprint": source_fingerprint}
+            written += 1
+        except SyntaxError as e:
+            return source_file, written, skipped, [(None, f"SyntaxError: {e}")], records
+        except Exception as e:
+            errors.append((pip_no, f"{type(e).__name__}: {e}"))
+    return source_file, written, skipped, errors, records
+
+
+def get_source_files(source_dir):
+    with os.scandir(source_dir) as entries:
+        return sorted(entry.path for entry in entries if entry.is_file() and entry.name.endswith(".py"))
+
+
+def generate_target_tree(source_dir, target_dir, pipelines=None, workers=None, chunksize=16,
+                         cache_dir=DEFAULT_CACHE_DIR, seed=0, manifest=None, profile_options=None):
+    pipelines = dict(pipelines or DEFAULT_PIPELINES)
+    digests = {pip_no: pipeline_digest(stages, seed) for pip_no, stages in pipelines.items()}
+    source_files = get_source_files(source_dir)
+    previous = manifest.entries(MANIFEST_STAGE) if manifest is not None else {}
+    tasks = []
+    for source_file in source_files:
+        outputs = [variant_path(target_dir, source_file, pip_no) for pip_no in pipelines]
+        tasks.append((source_file, {path: previous[path]["inputs"] for path in outputs if path in previous}))
+
+    quarantine = []
+    written = 0
+    skipped = 0
+    noop = 0
+    duplicates = 0
+    profiled = []
+    if profile_options:
+        profiling.clear_profiles(profile_options["profile_dir"])
+    start = time.perf_counter()
+
+    initargs = (pipelines, target_dir, cache_dir, seed, digests, instrument.enabled(), profile_options)
+    if workers == 1:
+        init_worker(*initargs)
+        results = map(process_file, tasks)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=initargs)
+        results = executor.map(process_file, tasks, chunksize=chunksize)
+    try:
+        for source_file, file_written, file_skipped, errors, records, timings, file_profiles in results:
+            instrument.merge(timings)
+            profiled.extend(file_profiles)
+            written += file_written
+            skipped += file_skipped
+            seen = set()
+            for entry in records.values():
+                noop += entry["fingerprint"] == entry["source_fingerprint"]
+                duplicates += entry["fingerprint"] in seen
+                seen.add(entry["fingerprint"])
+            if manifest is not None:
+                for output_path, entry in records.items():
+                    manifest.record(MANIFEST_STAGE, output_path, entry.pop("inputs"), **entry)
+            for pip_no, error in errors:
+                label = f" (PipNo_{pip_no})" if pip_no is not None else ""
+                print(f"Quarantined {source_file}{label}: {error}")
+                quarantine.append({"file": source_file, "pipeline": pip_no, "error": error})
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        elif _worker["profiler"] is not None:
+            _worker["profiler"].flush()
+        if manifest is not None:
+            manifest.save()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "files": len(source_files),
+        "variants_written": written,
+        "variants_skipped": skipped,
+        "variants_noop": noop,
+        "variants_duplicate": duplicates,
+        "quarantined": quarantine,
+        "profiled": profiled,
+        "seconds": elapsed,
+        "files_per_sec": len(source_files) / elapsed if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build target/<base>/PipNo_N_<file>.py for every source file.")
+    parser.add_argument("--source", default="source", help="Directory containing the source .py files")
+    parser.add_argument("--target", default="target", help="Directory to write the refactored variants to")
+    parser.add_argument("--pipeline", action="append", type=parse_pipeline_spec, metavar="N=STAGE,...",
+                        help=f"Pipeline definition, repeatable. Stages: {', '.join(TRANSFORMERS)}")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=16, help="Files handed to a worker at a time")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Parse cache directory")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed for the randomized transformers")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST, help="Incremental rebuild manifest")
+    parser.add_argument("--force", action="store_true", help="Regenerate every variant, ignoring the manifest")
+    parser.add_argument("--quarantine", default="quarantine.json", help="Where to write files that failed")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help="Source/variant index to refresh afterwards")
+    instrument.add_argument(parser)
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.enable(args.instrument is not None)
+    profile_options = profiling.options_from(args)
+
+    pipelines = dict(args.pipeline) if args.pipeline else DEFAULT_PIPELINES
+    manifest = Manifest(args.manifest)
+    if args.force:
+        manifest.entries(MANIFEST_STAGE).clear()
+    stats = generate_target_tree(args.source, args.target, pipelines, args.workers, args.chunksize,
+                                 args.cache_dir, args.seed, manifest, profile_options)
+    # New variants land in existing target folders, which the index cannot detect on its own.
+    CorpusIndex(args.source, args.target, args.index, refresh=True)
+
+    with open(args.quarantine, 'w', encoding='utf-8') as f:
+        json.dump(stats["quarantined"], f, indent=2)
+    print(f"Processed {stats['files']} files ({stats['variants_written']} variants written, "
+          f"{stats['variants_skipped']} up to date) in {stats['seconds']:.2f}s - "
+          f"{stats['files_per_sec']:.1f} files/sec")
+    print(f"{stats['variants_noop']} written variants are identical to their source and "
+          f"{stats['variants_duplicate']} duplicate another pipeline's output")
+    print(f"Quarantined {len(stats['quarantined'])} failures, see {args.quarantine}")
+    if args.instrument:
+        instrument.report(args.instrument)
+    if profile_options:
+        profiling.report(args.profile_dir, stats["profiled"], args.profile_top, profiling.transformer_files())
+
+
+if __name__ == "__main__":
+    main()
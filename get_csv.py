@@ -1,38 +1,43 @@
+import argparse
+import csv
 import os
-import pandas as pd
+
+import instrument
+from corpus_index import CorpusIndex
+from hashing import file_hash
+from manifest import Manifest, inputs_digest
 
 source_folder = "././source"
 target_folder = "././target"
-pip_prefixes = ["PipNo_1_", "PipNo_2_", "PipNo_3_", "PipNo_4_"]
 output_file = "pyclone_res.csv"
 
-pairs = []
-
-for source_file in os.listdir(source_folder):
-    if source_file.endswith(".py"):
-        source_filename = source_file
-        source_file_base = os.path.splitext(source_file)[0]
-        source_path = os.path.join(source_folder, source_filename)
-
-        if not os.path.exists(source_path):
-            continue
-
-        target_fold = os.path.join(target_folder, source_file_base)
-        if not os.path.exists(target_fold):
-            continue
-
-        for pip_prefix in pip_prefixes:
-            refactored_file = f"{pip_prefix}{source_filename}"
-            refactored_path = os.path.join(target_fold, refactored_file)
-
-            if os.path.exists(refactored_path):
-                pairs.append({
-                    "code1": source_path,
-                    "code2": refactored_path
-                })
-            else:
-                print(f"Refactored file missing: {refactored_path}")
-
-df = pd.DataFrame(pairs)
-df.to_csv(output_file, index=False)
-print(f"CSV saved to {output_file} with {len(df)} valid pairs.")
+parser = argparse.ArgumentParser(description="Write every source/variant pair to a CSV for clone detection.")
+instrument.add_argument(parser)
+args = parser.parse_args()
+instrument.enable(args.instrument is not None)
+
+with instrument.timed("corpus_index"):
+    index = CorpusIndex(source_folder, target_folder)
+pairs = [{"code1": source_path, "code2": refactored_path} for source_path, _, refactored_path in index.pairs()]
+
+manifest = Manifest()
+generated = manifest.entries("generate")
+with instrument.timed("inputs_digest", items=len(pairs)):
+    digest = inputs_digest(*(
+        f"{pair['code1']}|{pair['code2']}|"
+        f"{generated.get(os.path.normpath(pair['code2']), {}).get('inputs') or file_hash(pair['code2'])}"
+        for pair in pairs
+    ))
+
+if manifest.is_current("get_csv", output_file, digest) and os.path.exists(output_file):
+    print(f"{output_file} is up to date with {len(pairs)} valid pairs.")
+else:
+    with instrument.timed("write_csv", items=len(pairs)), open(output_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=["code1", "code2"], lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(pairs)
+    manifest.record("get_csv", output_file, digest)
+    manifest.save()
+    print(f"CSV saved to {output_file} with {len(pairs)} valid pairs.")
+if args.instrument:
+    instrument.report(args.instrument)
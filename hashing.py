@@ -0,0 +1,17 @@
+import hashlib
+
+
+def content_hash(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(file_path):
+    with open(file_path, 'rb') as f:
+        return content_hash(f.read())
+
+
+def variant_seed(seed, index):
+    # Stable across processes and Python versions, unlike hash().
+    return int(content_hash(f"{seed}:{index}")[:16], 16)
@@ -0,0 +1,165 @@
+import json
+import math
+import os
+import sys
+import time
+from collections import defaultdict
+
+DEFAULT_TRACE = "instrument_trace.json"
+PERCENTILES = (50, 90, 99)
+# A file is an outlier for a stage when it took this many times the stage's median.
+OUTLIER_FACTOR = 10
+
+_state = {"enabled": False, "file": None}
+# (stage, file, start, seconds, items, pid) for every timed span in this process.
+RECORDS = []
+
+if hasattr(os, "register_at_fork"):
+    # A forked worker starts empty; its parent still holds what came before.
+    os.register_at_fork(after_in_child=RECORDS.clear)
+
+
+class Timer:
+    __slots__ = ("stage", "items", "file", "start")
+
+    def __init__(self, stage, items, file):
+        self.stage = stage
+        self.items = items
+        self.file = file
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        RECORDS.append((self.stage, self.file, self.start, time.perf_counter() - self.start, self.items, os.getpid()))
+
+
+class NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+def enable(enabled=True):
+    _state["enabled"] = enabled
+
+
+def enabled():
+    return _state["enabled"]
+
+
+def set_file(path):
+    """Attribute the spans that follow to ``path`` unless they name a file themselves."""
+    _state["file"] = path
+
+
+def timed(stage, items=1, file=None):
+    """Context manager timing one span of ``stage``; a shared no-op while instrumentation is off."""
+    if not _state["enabled"]:
+        return NULL_TIMER
+    return Timer(stage, items, file if file is not None else _state["file"])
+
+
+def record(stage, seconds, items=1, file=None):
+    if _state["enabled"]:
+        RECORDS.append((stage, file if file is not None else _state["file"], None, seconds, items, os.getpid()))
+
+
+def drain():
+    """Hand over and forget this process's records, for a worker to return them with its results."""
+    records = list(RECORDS)
+    RECORDS.clear()
+    return records
+
+
+def merge(records):
+    RECORDS.extend(records)
+
+
+def percentile(ordered, p):
+    # Nearest rank on an already sorted list.
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(records, limit=10):
+    """Per-stage totals, percentiles and throughput, plus the files that took far longer than the stage median."""
+    spans = defaultdict(list)
+    items = defaultdict(int)
+    per_file = defaultdict(lambda: defaultdict(float))
+    for stage, file, _, seconds, count, _ in records:
+        spans[stage].append(seconds)
+        items[stage] += count
+        if file is not None:
+            per_file[stage][file] += seconds
+
+    stages = {}
+    outliers = []
+    for stage, durations in sorted(spans.items()):
+        durations.sort()
+        total = sum(durations)
+        stages[stage] = dict({
+            "spans": len(durations),
+            "items": items[stage],
+            "total": total,
+            "mean": total / len(durations),
+            "max": durations[-1],
+            "items_per_sec": items[stage] / total if total else None,
+        }, **{f"p{p}": percentile(durations, p) for p in PERCENTILES})
+        files = sorted(per_file[stage].values())
+        if len(files) < 2:
+            continue
+        median = percentile(files, 50)
+        for file, seconds in per_file[stage].items():
+            if median and seconds >= OUTLIER_FACTOR * median:
+                outliers.append({"stage": stage, "file": file, "seconds": seconds, "times_median": seconds / median})
+    outliers.sort(key=lambda outlier: outlier["times_median"], reverse=True)
+    return {"stages": stages, "outliers": outliers[:limit]}
+
+
+def print_report(summary):
+    print("Stage timings:")
+    print(f"  {'stage':<32} {'spans':>7} {'items':>9} {'total s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} "
+          f"{'max ms':>9} {'items/s':>10}")
+    for stage, stats in sorted(summary["stages"].items(), key=lambda item: item[1]["total"], reverse=True):
+        rate = f"{stats['items_per_sec']:.1f}" if stats["items_per_sec"] is not None else "-"
+        print(f"  {stage:<32} {stats['spans']:>7} {stats['items']:>9} {stats['total']:>9.3f} "
+              f"{stats['p50'] * 1000:>9.2f} {stats['p90'] * 1000:>9.2f} {stats['p99'] * 1000:>9.2f} "
+              f"{stats['max'] * 1000:>9.2f} {rate:>10}")
+    if summary["outliers"]:
+        print(f"Outlier files (at least {OUTLIER_FACTOR}x the stage median):")
+        for outlier in summary["outliers"]:
+            print(f"  {outlier['stage']}: {outlier['file']} {outlier['seconds'] * 1000:.2f} ms "
+                  f"({outlier['times_median']:.0f}x median)")
+
+
+def write_trace(path, records, summary):
+    trace = {
+        "argv": sys.argv,
+        "summary": summary,
+        "events": [{"stage": stage, "file": file, "start": start, "seconds": seconds, "items": items, "pid": pid}
+                   for stage, file, start, seconds, items, pid in records],
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(trace, f, indent=1)
+
+
+def add_argument(parser):
+    parser.add_argument("--instrument", nargs="?", const=DEFAULT_TRACE, default=None, metavar="TRACE",
+                        help=f"Time every pipeline stage, print a report and write a JSON trace (default: {DEFAULT_TRACE})")
+
+
+def report(trace_path):
+    """Print the report for every record gathered in this process and write the trace to ``trace_path``."""
+    summary = summarize(RECORDS)
+    print_report(summary)
+    write_trace(trace_path, RECORDS, summary)
+    print(f"Instrumentation trace written to {trace_path}")
+    return summary
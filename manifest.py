@@ -0,0 +1,60 @@
+import inspect
+import json
+import os
+import tempfile
+
+from hashing import content_hash, file_hash
+
+DEFAULT_MANIFEST = "manifest.json"
+
+
+def inputs_digest(*parts):
+    return content_hash("\0".join(str(part) for part in parts))
+
+
+def module_source_hash(obj):
+    cls = obj if inspect.isclass(obj) else type(obj)
+    return file_hash(inspect.getsourcefile(cls))
+
+
+class Manifest:
+    """Input digests of everything a stage produced, keyed by stage and output.
+
+    A stage asks ``is_current(stage, key, digest)`` before redoing work and
+    calls ``record`` afterwards. Extra keyword data (e.g. a score or a test
+    verdict) is stored with the entry so skipped work can still be reported.
+    """
+
+    def __init__(self, path=DEFAULT_MANIFEST):
+        self.path = path
+        self.stages = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.stages = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable manifest {path}: {e}")
+
+    def entries(self, stage):
+        return self.stages.setdefault(stage, {})
+
+    def get(self, stage, key):
+        return self.stages.get(stage, {}).get(key)
+
+    def is_current(self, stage, key, digest):
+        entry = self.get(stage, key)
+        return entry is not None and entry.get("inputs") == digest
+
+    def record(self, stage, key, digest, **data):
+        self.entries(stage)[key] = dict(data, inputs=digest)
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".manifest_", suffix=".json")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.stages, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
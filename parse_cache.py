@@ -0,0 +1,134 @@
+import ast
+import gc
+import os
+import pickle
+import sys
+import tempfile
+import zlib
+from collections import OrderedDict
+
+import instrument
+from hashing import content_hash
+
+# The pickled AST layout is only valid for the interpreter that produced it.
+PYTHON_TAG = sys.implementation.cache_tag
+DEFAULT_CACHE_DIR = ".parse_cache"
+
+
+def _clone(node):
+    cls = node.__class__
+    new = cls.__new__(cls)
+    src = node.__dict__
+    dst = new.__dict__
+    for name in cls._fields:
+        value = src.get(name)
+        if isinstance(value, ast.AST):
+            if value.__class__._fields or value.__class__._attributes:
+                value = _clone(value)
+        elif value.__class__ is list:
+            value = [_clone(item) if isinstance(item, ast.AST) else item for item in value]
+        dst[name] = value
+    for name in cls._attributes:
+        if name in src:
+            dst[name] = src[name]
+    return new
+
+
+def without_gc(func, *args):
+    # Building a tree allocates only acyclic containers; letting the cyclic
+    # collector scan them mid-build roughly doubles the cost.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return func(*args)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def clone_tree(node):
+    """Structural copy of a parsed tree.
+
+    Only ``_fields`` and ``_attributes`` are copied, so helper attributes that
+    transformers hang on nodes (e.g. ``parent``) are dropped. Leaf values and
+    the field-less context/operator singletons are shared with the original.
+    """
+    return without_gc(_clone, node)
+
+
+class ParseCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, memory_size=128):
+        self.cache_dir = cache_dir
+        self.memory_size = memory_size
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, source_code):
+        return content_hash(f"{PYTHON_TAG}\0{source_code}")
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.ast")
+
+    def remember(self, key, tree):
+        self.memory[key] = tree
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def load(self, key):
+        path = self.path_for(key)
+        try:
+            with open(path, 'rb') as f:
+                return without_gc(pickle.loads, zlib.decompress(f.read()))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Discarding unreadable parse cache entry {path}: {e}")
+            return None
+
+    def store(self, key, tree):
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = zlib.compress(pickle.dumps(tree, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def get_tree(self, source_code, filename="<unknown>"):
+        """Return the cached base tree; callers must clone before mutating."""
+        with instrument.timed("parse"):
+            return self.lookup(source_code, filename)
+
+    def lookup(self, source_code, filename):
+        if isinstance(source_code, bytes):
+            source_code = source_code.decode("utf-8")
+        key = self.key(source_code)
+        tree = self.memory.get(key)
+        if tree is None:
+            tree = self.load(key)
+            if tree is None:
+                self.misses += 1
+                tree = ast.parse(source_code, filename=filename)
+                self.store(key, tree)
+            else:
+                self.hits += 1
+            self.remember(key, tree)
+        else:
+            self.hits += 1
+            self.memory.move_to_end(key)
+        return tree
+
+    def parse(self, source_code, filename="<unknown>"):
+        tree = self.get_tree(source_code, filename)
+        with instrument.timed("clone_tree"):
+            return clone_tree(tree)
+
+    def parse_file(self, file_path):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return self.parse(f.read(), filename=file_path)
@@ -1,16 +1,19 @@
 import ast
 import os
+from collections import deque
 
 class PartialsRefactor(ast.NodeTransformer):
     def __init__(self):
         self.var_con_map = {}  # Mapping of variables to their constant values
         self.remove_list = []  # List of assignment nodes to remove
+        self.remove_nodes = set()  # Same nodes, for identity-based membership tests
         self.var_uses = {}     # Track variable usage contexts
         self.current_scope = []  # Track current scope (e.g., ["module", "function_name"])
 
     def collect_assignments_and_uses(self, tree):
         self.var_con_map = {}
         self.remove_list = []
+        self.remove_nodes = set()
         self.var_uses = {}
         self.current_scope = ["module"]
 
@@ -18,65 +21,69 @@ class PartialsRefactor(ast.NodeTransformer):
         def get_qualified_name(var_id):
             return ".".join(self.current_scope + [var_id])
 
-        # First pass: Collect variable uses
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                self.current_scope.append(node.name)
-                for child in ast.walk(node):
-                    if isinstance(child, ast.Name):
-                        qname = get_qualified_name(child.id)
-                        if qname not in self.var_uses:
-                            self.var_uses[qname] = []
-                        self.var_uses[qname].append(child.parent if hasattr(child, 'parent') else None)
-                self.current_scope.pop()
-            elif isinstance(node, ast.ClassDef):
-                self.current_scope.append(node.name)
-                for child in ast.walk(node):
-                    if isinstance(child, ast.Name):
-                        qname = get_qualified_name(child.id)
-                        if qname not in self.var_uses:
-                            self.var_uses[qname] = []
-                        self.var_uses[qname].append(child.parent if hasattr(child, 'parent') else None)
-                self.current_scope.pop()
-            elif isinstance(node, ast.Name):
-                qname = get_qualified_name(node.id)
-                if qname not in self.var_uses:
-                    self.var_uses[qname] = []
-                self.var_uses[qname].append(node.parent if hasattr(node, 'parent') else None)
+        # Single breadth-first pass (the same order as ast.walk). Each queued node
+        # carries the names of the functions/classes enclosing it, so a use is
+        # recorded under "module.<id>" and under "module.<scope>.<id>" for every
+        # enclosing scope without re-walking their subtrees.
+        edges = []
+        assignments = []
+        queue = deque([(tree, ())])
+        while queue:
+            node, scopes = queue.popleft()
+            if isinstance(node, ast.Name):
+                parent = node.parent if hasattr(node, 'parent') else None
+                self.var_uses.setdefault(get_qualified_name(node.id), []).append(parent)
+                for scope in scopes:
+                    self.var_uses.setdefault(f"module.{scope}.{node.id}", []).append(parent)
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)) and isinstance(node.value, ast.Constant):
+                assignments.append(node)
+            if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+                scopes = scopes + (node.name,)
+            for child in ast.iter_child_nodes(node):
+                edges.append((child, node))
+                queue.append((child, scopes))
 
         # Add parent references for accurate usage tracking
-        for node in ast.walk(tree):
-            for child in ast.iter_child_nodes(node):
-                child.parent = node
-
-        # Second pass: Collect constant assignments
-        for node in ast.walk(tree):
-            if isinstance(node, (ast.Assign, ast.AnnAssign)) and isinstance(node.value, ast.Constant):
-                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
-                for target in targets:
-                    if isinstance(target, ast.Name):
-                        qname = get_qualified_name(target.id)
-                        self.var_con_map[qname] = node.value.value
-                        self.remove_list.append(node)
-                    elif isinstance(target, ast.Tuple):
-                        for elt in target.elts:
-                            if isinstance(elt, ast.Name):
-                                qname = get_qualified_name(elt.id)
-                                self.var_con_map[qname] = node.value.value
-                                self.remove_list.append(node)
+        for child, node in edges:
+            child.parent = node
+
+        # Collect constant assignments
+        for node in assignments:
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                if isinstance(target, ast.Name):
+                    qname = get_qualified_name(target.id)
+                    self.var_con_map[qname] = node.value.value
+                    self.remove_list.append(node)
+                elif isinstance(target, ast.Tuple):
+                    for elt in target.elts:
+                        if isinstance(elt, ast.Name):
+                            qname = get_qualified_name(elt.id)
+                            self.var_con_map[qname] = node.value.value
+                            self.remove_list.append(node)
 
         # Filter remove_list to keep assignments for variables used outside safe contexts
+        candidates = set(self.remove_list)
+        safe_names = {}
+
+        def uses_are_safe(qname):
+            if qname not in safe_names:
+                safe_names[qname] = all(
+                    isinstance(parent, (ast.Call, ast.Name, ast.Assign, ast.AnnAssign)) and
+                    (not isinstance(parent, (ast.Assign, ast.AnnAssign)) or parent in candidates)
+                    for parent in self.var_uses.get(qname, [])
+                    if parent is not None
+                )
+            return safe_names[qname]
+
         self.remove_list = [
-            node for node in self.remove_list
-            for target in (node.targets if isinstance(node, ast.Assign) else [node.target])
-            if isinstance(target, ast.Name) and all(
-                isinstance(parent, (ast.Call, ast.Name, ast.Assign, ast.AnnAssign)) and
-                (not isinstance(parent, ast.Assign) or parent in self.remove_list) and
-                (not isinstance(parent, ast.AnnAssign) or parent in self.remove_list)
-                for parent in self.var_uses.get(get_qualified_name(target.id), [])
-                if parent is not None
+            node for node in dict.fromkeys(self.remove_list)
+            if any(
+                isinstance(target, ast.Name) and uses_are_safe(get_qualified_name(target.id))
+                for target in (node.targets if isinstance(node, ast.Assign) else [node.target])
             )
         ]
+        self.remove_nodes = set(self.remove_list)
 
     def print_mapping(self):
         print("Variable to Constant Mapping:", self.var_con_map)
@@ -84,7 +91,7 @@ class PartialsRefactor(ast.NodeTransformer):
 
     def visit_Module(self, node):
         self.collect_assignments_and_uses(node)
-        new_body = [n for n in node.body if n not in self.remove_list]
+        new_body = [n for n in node.body if n not in self.remove_nodes]
         
         for idx, node2 in enumerate(new_body):
             if isinstance(node2, ast.Assign) and isinstance(node2.value, ast.Call) and node2.value.args:
@@ -123,8 +130,11 @@ class PartialsRefactor(ast.NodeTransformer):
         self.current_scope.pop()
         return node
 
+    def transform_tree(self, tree):
+        return self.visit(tree)
+
     def refactor_keywords(self, tree):
-        self.visit(tree)
+        self.transform_tree(tree)
         ast.fix_missing_locations(tree)
         return ast.unparse(tree)
 
@@ -1,10 +1,12 @@
 import ast
-from typing import List, Dict, Optional
+from collections import deque
+from typing import List, Dict, Optional, Set
 
 class PartialsRefactor(ast.NodeTransformer):
     def __init__(self):
         self.var_con_map: Dict[str, ast.Constant] = {}  
         self.remove_list: List[ast.AST] = []  
+        self.remove_nodes: Set[ast.AST] = set()
         self.var_uses: Dict[str, List[ast.AST]] = {}  
         self.current_scope: List[str] = ["module"]  
 
@@ -14,6 +16,7 @@ class PartialsRefactor(ast.NodeTransformer):
     def collect_assignments_and_uses(self, tree: ast.AST) -> None:
         self.var_con_map = {}
         self.remove_list = []
+        self.remove_nodes = set()
         self.var_uses = {}
         self.current_scope = ["module"]
 
@@ -21,24 +24,18 @@ class PartialsRefactor(ast.NodeTransformer):
             for child in ast.iter_child_nodes(node):
                 child.parent = node  
 
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                self.current_scope.append(node.name)
-                for child in ast.walk(node):
-                    if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Load):
-                        qname = self._get_qualified_name(child.id)
-                        self.var_uses.setdefault(qname, []).append(child.parent)
-                self.current_scope.pop()
-            elif isinstance(node, ast.ClassDef):
-                self.current_scope.append(node.name)
-                for child in ast.walk(node):
-                    if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Load):
-                        qname = self._get_qualified_name(child.id)
-                        self.var_uses.setdefault(qname, []).append(child.parent)
-                self.current_scope.pop()
-            elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+        # Single breadth-first pass (the same order as ast.walk). Each queued node
+        # carries the names of the functions/classes enclosing it, so a load is
+        # recorded under "module.<id>" and under "module.<scope>.<id>" for every
+        # enclosing scope without re-walking their subtrees.
+        queue = deque([(tree, ())])
+        while queue:
+            node, scopes = queue.popleft()
+            if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
                 qname = self._get_qualified_name(node.id)
                 self.var_uses.setdefault(qname, []).append(node.parent)
+                for scope in scopes:
+                    self.var_uses.setdefault(f"module.{scope}.{node.id}", []).append(node.parent)
 
             if isinstance(node, (ast.Assign, ast.AnnAssign)):
                 targets = node.targets if isinstance(node, ast.Assign) else [node.target]
@@ -55,20 +52,29 @@ class PartialsRefactor(ast.NodeTransformer):
                                     self.var_con_map[qname] = node.value
                                     self.remove_list.append(node)
 
+            if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+                scopes = scopes + (node.name,)
+            for child in ast.iter_child_nodes(node):
+                queue.append((child, scopes))
+
+        safe_names: Dict[str, bool] = {}
         filtered_remove_list = []
-        for node in self.remove_list:
+        for node in dict.fromkeys(self.remove_list):
             safe = True
             targets = node.targets if isinstance(node, ast.Assign) else [node.target]
             for target in targets:
                 if isinstance(target, ast.Name):
                     qname = self._get_qualified_name(target.id)
-                    uses = self.var_uses.get(qname, [])
-                    if not all(isinstance(parent, (ast.Call, type(None))) for parent in uses):
+                    if qname not in safe_names:
+                        uses = self.var_uses.get(qname, [])
+                        safe_names[qname] = all(isinstance(parent, (ast.Call, type(None))) for parent in uses)
+                    if not safe_names[qname]:
                         safe = False
                         break
             if safe:
                 filtered_remove_list.append(node)
         self.remove_list = filtered_remove_list
+        self.remove_nodes = set(filtered_remove_list)
 
     def print_mapping(self) -> None:
         print("Variable to Constant Mapping:", {
@@ -80,13 +86,13 @@ class PartialsRefactor(ast.NodeTransformer):
 
     def visit_Module(self, node: ast.Module) -> ast.Module:
         self.collect_assignments_and_uses(node)
-        new_body = [n for n in node.body if n not in self.remove_list]
+        new_body = [n for n in node.body if n not in self.remove_nodes]
         node.body = new_body
         return self.generic_visit(node)
 
     def visit_FunctionDef(self, node: ast.FunctionDef) -> ast.FunctionDef:
         self.current_scope.append(node.name)
-        new_body = [n for n in node.body if n not in self.remove_list]
+        new_body = [n for n in node.body if n not in self.remove_nodes]
 
         for idx, node2 in enumerate(new_body):
             if isinstance(node2, ast.Assign) and isinstance(node2.value, ast.Call):
@@ -133,10 +139,13 @@ class PartialsRefactor(ast.NodeTransformer):
         self.current_scope.pop()
         return node
 
+    def transform_tree(self, tree: ast.AST) -> ast.AST:
+        return self.visit(tree)
+
     def get_refactored_code(self, source_code: str) -> str:
         try:
             tree = ast.parse(source_code)
-            transformed_tree = self.visit(tree)
+            transformed_tree = self.transform_tree(tree)
             ast.fix_missing_locations(transformed_tree)
             return ast.unparse(transformed_tree)
         except Exception as e:
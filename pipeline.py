@@ -0,0 +1,104 @@
+import ast
+import time
+
+import instrument
+import reorder
+import shufflefuncs
+import partials_l
+import partials_ls
+from addconst_l import AddDefaultArgValue
+from asserts import AddAssertions
+from funcvaridentifier import VariableRefactator
+from lamda_l import LambdaRefactor
+from remvarassign import ParameterRefactor
+
+TRANSFORMERS = {
+    "assertions": AddAssertions,
+    "lambda": LambdaRefactor,
+    "parameters": ParameterRefactor,
+    "default_args": AddDefaultArgValue,
+    "reorder": reorder.ShuffleFunctions,
+    "shuffle": shufflefuncs.ShuffleFunctions,
+    "partials": partials_l.PartialsRefactor,
+    "partials_ls": partials_ls.PartialsRefactor,
+    "variables": VariableRefactator,
+}
+
+
+class Pipeline:
+    """Runs several transformers over a single parse of the source.
+
+    Stages that expose ``rewrite_statement`` only ever rewrite one module-level
+    statement at a time, so consecutive runs of them are fused into a single
+    walk over the module body. Every other stage gets the whole tree through
+    its ``transform_tree`` method.
+    """
+
+    def __init__(self, stages):
+        self.stages = [TRANSFORMERS[stage]() if isinstance(stage, str) else stage for stage in stages]
+        self.names = [stage if isinstance(stage, str) else type(stage).__name__ for stage in stages]
+        self.labels = {id(stage): f"transform:{name}" for stage, name in zip(self.stages, self.names)}
+        self.groups = self.fuse_stages(self.stages)
+
+    @staticmethod
+    def fuse_stages(stages):
+        groups = []
+        for stage in stages:
+            fusable = hasattr(stage, "rewrite_statement")
+            if fusable and groups and groups[-1][0]:
+                groups[-1][1].append(stage)
+            else:
+                groups.append((fusable, [stage]))
+        return groups
+
+    def rewrite_module_body(self, tree, stages):
+        if instrument.enabled():
+            return self.rewrite_module_body_timed(tree, stages)
+        new_body = []
+        for stmt in tree.body:
+            pending = [stmt]
+            for stage in stages:
+                pending = [out for node in pending for out in stage.rewrite_statement(node)]
+            new_body.extend(pending)
+        tree.body = new_body
+        return tree
+
+    def rewrite_module_body_timed(self, tree, stages):
+        # Fused stages take turns on every statement, so each one's time is
+        # summed over the module and recorded once.
+        spent = [0.0] * len(stages)
+        new_body = []
+        for stmt in tree.body:
+            pending = [stmt]
+            for i, stage in enumerate(stages):
+                start = time.perf_counter()
+                pending = [out for node in pending for out in stage.rewrite_statement(node)]
+                spent[i] += time.perf_counter() - start
+            new_body.extend(pending)
+        for stage, seconds in zip(stages, spent):
+            instrument.record(self.labels[id(stage)], seconds)
+        tree.body = new_body
+        return tree
+
+    def transform_tree(self, tree):
+        for fused, stages in self.groups:
+            if fused and isinstance(tree, ast.Module):
+                tree = self.rewrite_module_body(tree, stages)
+            else:
+                for stage in stages:
+                    with instrument.timed(self.labels[id(stage)]):
+                        tree = stage.transform_tree(tree)
+        return tree
+
+    def refactor_tree(self, tree):
+        tree = self.transform_tree(tree)
+        with instrument.timed("fix_missing_locations"):
+            ast.fix_missing_locations(tree)
+        with instrument.timed("unparse"):
+            return ast.unparse(tree)
+
+    def get_refactored_code(self, source_code):
+        try:
+            return self.refactor_tree(ast.parse(source_code))
+        except SyntaxError as e:
+            raise ValueError(f"Syntax error in source code: {e}")
@@ -0,0 +1,208 @@
+import contextlib
+import cProfile
+import glob
+import inspect
+import json
+import multiprocessing.util
+import os
+import pstats
+import time
+import tracemalloc
+
+from pipeline import Pipeline, TRANSFORMERS
+
+DEFAULT_PROFILE_DIR = "profiles"
+MERGED_PROFILE = "merged.prof"
+REPORT_FILE = "report.json"
+TRACEMALLOC_FRAMES = 10
+# Seconds between dumps of a process's summed profile while files keep being kept.
+DUMP_SECONDS = 30
+
+
+def transformer_files():
+    """Source files of the pipeline engine and every registered transformer."""
+    classes = [Pipeline] + list(TRANSFORMERS.values())
+    return {os.path.abspath(inspect.getsourcefile(cls)) for cls in classes}
+
+
+def function_label(key):
+    filename, lineno, name = key
+    return f"{os.path.basename(filename)}:{lineno}({name})"
+
+
+def hottest_functions(stats, limit=10, files=None):
+    """[(label, calls, own seconds, cumulative seconds)] by own time, optionally only from ``files``."""
+    rows = []
+    for key, (_, calls, own, cumulative, _) in stats.stats.items():
+        if files is None or os.path.abspath(key[0]) in files:
+            rows.append((function_label(key), calls, own, cumulative))
+    rows.sort(key=lambda row: row[2], reverse=True)
+    return rows[:limit]
+
+
+class FileProfiler:
+    """cProfile and/or tracemalloc around the processing of one file at a time.
+
+    Only files slower than ``min_seconds`` or whose traced peak grew by more
+    than ``min_kb`` are kept. Their profiles are summed into one profile per
+    process and dumped to ``<profile_dir>/worker_<pid>.prof`` every
+    ``DUMP_SECONDS`` and when the process exits (``flush`` does it on demand);
+    their summaries are handed back with ``drain``. ``merge_profiles``
+    combines the worker profiles at the end of the run.
+    """
+
+    def __init__(self, profile_dir=DEFAULT_PROFILE_DIR, profile=True, trace_malloc=False, min_seconds=1.0,
+                 min_kb=10240, limit=10):
+        self.profile_dir = profile_dir
+        self.profile = profile
+        self.trace_malloc = trace_malloc
+        self.min_seconds = min_seconds
+        self.min_kb = min_kb
+        self.limit = limit
+        self.stats = None
+        self.dirty = False
+        self.dumped = time.monotonic()
+        self.kept = []
+        # Pool workers run their finalizers when the pool shuts down.
+        multiprocessing.util.Finalize(self, self.flush, exitpriority=10)
+        if trace_malloc and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+
+    @contextlib.contextmanager
+    def measure(self, label):
+        profiler = cProfile.Profile() if self.profile else None
+        if self.trace_malloc:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            seconds = time.perf_counter() - start
+            peak_kb = None
+            if self.trace_malloc:
+                _, peak = tracemalloc.get_traced_memory()
+                peak_kb = (peak - before) / 1024
+            slow = seconds >= self.min_seconds
+            heavy = peak_kb is not None and peak_kb >= self.min_kb
+            if slow or heavy:
+                self.keep(label, seconds, peak_kb, profiler, snapshot if self.trace_malloc else None)
+
+    def keep(self, label, seconds, peak_kb, profiler, snapshot):
+        entry = {"file": label, "seconds": seconds, "peak_kb": peak_kb, "pid": os.getpid()}
+        if profiler is not None:
+            stats = pstats.Stats(profiler)
+            entry["functions"] = [
+                {"function": name, "calls": calls, "own": own, "cumulative": cumulative}
+                for name, calls, own, cumulative in hottest_functions(stats, self.limit)
+            ]
+            if self.stats is None:
+                self.stats = stats
+            else:
+                self.stats.add(stats)
+            self.dirty = True
+            if time.monotonic() - self.dumped >= DUMP_SECONDS:
+                self.flush()
+        if snapshot is not None:
+            # Allocations still alive after the file, by the line that made them.
+            grown = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ]).compare_to(snapshot, "lineno")
+            entry["allocations"] = [
+                {"line": str(stat.traceback), "size_kb": stat.size_diff / 1024, "count": stat.count_diff}
+                for stat in grown[:self.limit]
+            ]
+        self.kept.append(entry)
+
+    def flush(self):
+        """Write this process's summed profile, if it changed since the last dump."""
+        if not self.dirty:
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        self.stats.dump_stats(os.path.join(self.profile_dir, f"worker_{os.getpid()}.prof"))
+        self.dirty = False
+        self.dumped = time.monotonic()
+
+    def drain(self):
+        kept = self.kept
+        self.kept = []
+        return kept
+
+
+def clear_profiles(profile_dir):
+    """Remove the worker and merged profiles left over from an earlier run."""
+    paths = glob.glob(os.path.join(profile_dir, "worker_*.prof")) + glob.glob(os.path.join(profile_dir, MERGED_PROFILE))
+    for path in paths:
+        os.remove(path)
+
+
+def merge_profiles(profile_dir):
+    """Sum every worker profile into ``<profile_dir>/merged.prof``; None if no file was slow enough."""
+    paths = sorted(glob.glob(os.path.join(profile_dir, "worker_*.prof")))
+    if not paths:
+        return None
+    stats = pstats.Stats(*paths)
+    stats.dump_stats(os.path.join(profile_dir, MERGED_PROFILE))
+    return stats
+
+
+def report(profile_dir, kept, limit=20, files=None):
+    """Rank the kept files and the hottest functions (only those defined in ``files``, if given).
+
+    Prints the ranking and writes it to ``report.json``.
+    """
+    stats = merge_profiles(profile_dir)
+    slowest = sorted(kept, key=lambda entry: entry["seconds"], reverse=True)[:limit]
+    heaviest = sorted((entry for entry in kept if entry["peak_kb"] is not None),
+                      key=lambda entry: entry["peak_kb"], reverse=True)[:limit]
+    hot = hottest_functions(stats, limit, files) if stats is not None else []
+
+    print(f"Profiled files kept: {len(kept)}")
+    if slowest:
+        print("Slowest files:")
+        for entry in slowest:
+            print(f"  {entry['seconds']:8.3f}s  {entry['file']}")
+    if heaviest:
+        print("Largest memory peaks:")
+        for entry in heaviest:
+            print(f"  {entry['peak_kb'] / 1024:8.1f} MB  {entry['file']}")
+    if hot:
+        print(f"Hottest functions{' in the transformer modules' if files is not None else ''} (own time):")
+        for name, calls, own, cumulative in hot:
+            print(f"  {own:8.3f}s own {cumulative:8.3f}s cumulative {calls:>9} calls  {name}")
+
+    os.makedirs(profile_dir, exist_ok=True)
+    with open(os.path.join(profile_dir, REPORT_FILE), 'w', encoding='utf-8') as f:
+        json.dump({
+            "files": kept,
+            "functions": [{"function": name, "calls": calls, "own": own, "cumulative": cumulative}
+                                      for name, calls, own, cumulative in hot],
+        }, f, indent=1)
+    print(f"Profiling report written to {os.path.join(profile_dir, REPORT_FILE)}"
+          + (f", merged profile to {os.path.join(profile_dir, MERGED_PROFILE)}" if stats is not None else ""))
+
+
+def add_arguments(parser):
+    parser.add_argument("--profile", action="store_true", help="cProfile every file and keep the slow ones")
+    parser.add_argument("--trace-malloc", action="store_true",
+                        help="Trace allocations per file with tracemalloc and keep the memory-heavy ones")
+    parser.add_argument("--profile-dir", default=DEFAULT_PROFILE_DIR, help="Where worker profiles and the report go")
+    parser.add_argument("--profile-min-seconds", type=float, default=1.0,
+                        help="Keep the profile of files that took at least this long")
+    parser.add_argument("--profile-min-kb", type=float, default=10240,
+                        help="Keep files whose traced memory peak grew by at least this many KiB")
+    parser.add_argument("--profile-top", type=int, default=20, help="Files and functions to list in the report")
+
+
+def options_from(args):
+    """Keyword arguments for FileProfiler from parsed ``add_arguments`` options; None when both modes are off."""
+    if not args.profile and not args.trace_malloc:
+        return None
+    return {"profile_dir": args.profile_dir, "profile": args.profile, "trace_malloc": args.trace_malloc,
+            "min_seconds": args.profile_min_seconds, "min_kb": args.profile_min_kb}
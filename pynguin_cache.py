@@ -0,0 +1,86 @@
+import json
+import os
+import re
+import tempfile
+from importlib import metadata
+
+from fingerprint import file_fingerprint
+from hashing import content_hash, file_hash
+
+DEFAULT_PYNGUIN_CACHE = ".pynguin_cache"
+
+
+def pynguin_version():
+    try:
+        return metadata.version("pynguin")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+class PynguinCache:
+    """Cleaned Pynguin test files keyed by (source fingerprint, Pynguin version, algorithm, iterations, seed).
+
+    Each entry is ``<key>.py`` plus ``<key>.json`` naming the module it was
+    generated for, so a hit for an identical module under another name can
+    have its imports rewritten. Entries are written atomically and can be
+    shared by parallel jobs.
+    """
+
+    def __init__(self, path=DEFAULT_PYNGUIN_CACHE, algorithm="DYNAMOSA", iterations=5000, seed=0, version=None):
+        self.path = path
+        self.algorithm = algorithm
+        self.iterations = iterations
+        self.seed = seed
+        self.version = version or pynguin_version()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, source_path):
+        # The AST fingerprint ignores comment and formatting edits, which do
+        # not change what Pynguin generates.
+        try:
+            source_key = file_fingerprint(source_path)
+        except (SyntaxError, ValueError):
+            source_key = file_hash(source_path)
+        return content_hash(json.dumps([source_key, self.version, self.algorithm, self.iterations, self.seed]))
+
+    def fetch(self, source_path, module_name, test_file):
+        """Copy the cached tests for ``source_path`` to ``test_file``; False on a miss."""
+        entry = os.path.join(self.path, self.key(source_path))
+        try:
+            with open(entry + ".json", 'r', encoding='utf-8') as f:
+                cached_module = json.load(f)["module"]
+            with open(entry + ".py", 'r', encoding='utf-8') as f:
+                tests = f.read()
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return False
+        if cached_module != module_name:
+            tests = re.sub(rf'^(\s*import\s+){re.escape(cached_module)}(\s+as\s+module_\d+)', rf'\g<1>{module_name}\2',
+                           tests, flags=re.M)
+        os.makedirs(os.path.dirname(os.path.abspath(test_file)), exist_ok=True)
+        with open(test_file, 'w', encoding='utf-8') as f:
+            f.write(tests)
+        self.hits += 1
+        return True
+
+    def store(self, source_path, module_name, test_file):
+        os.makedirs(self.path, exist_ok=True)
+        entry = os.path.join(self.path, self.key(source_path))
+        with open(test_file, 'r', encoding='utf-8') as f:
+            tests = f.read()
+        meta = {"module": module_name, "pynguin": self.version, "algorithm": self.algorithm,
+                "iterations": self.iterations, "seed": self.seed}
+        # Tests first, so a metadata file never points at a missing entry.
+        self.write(entry + ".py", tests)
+        self.write(entry + ".json", json.dumps(meta, indent=1))
+
+    def write(self, path, text):
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=".entry_")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
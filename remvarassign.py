@@ -4,6 +4,10 @@
 import ast
 
 class ParameterRefactor(ast.NodeTransformer):
+    def __init__(self):
+        # Module-level code before the first function has no parameters to rename.
+        self.par_var_map = {}
+
     def visit_FunctionDef(self, node):
         self.par_var_map = {}
         param_names = [arg.arg for arg in node.args.args]
@@ -33,8 +37,11 @@ class ParameterRefactor(ast.NodeTransformer):
                 )
         return node
 
+    def transform_tree(self, tree):
+        return self.visit(tree)
+
     def refactor_parameters(self, tree):
-        return ast.fix_missing_locations(self.visit(tree))
+        return ast.fix_missing_locations(self.transform_tree(tree))
 
     def get_refactored_code(self, source_code):
         try:
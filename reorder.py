@@ -1,6 +1,8 @@
 import ast
 import random
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from hashing import variant_seed
 
 class ShuffleFunctions(ast.NodeTransformer):
     def __init__(self):
@@ -70,10 +72,13 @@ class ShuffleFunctions(ast.NodeTransformer):
         node.body = new_body
         return self.generic_visit(node)
 
+    def transform_tree(self, tree: ast.AST) -> ast.AST:
+        return self.visit(tree)
+
     def reorder_functions(self, source_code: str) -> str:
         try:
             tree = ast.parse(source_code)
-            transformed_tree = self.visit(tree)
+            transformed_tree = self.transform_tree(tree)
             ast.fix_missing_locations(transformed_tree)
             return ast.unparse(transformed_tree)
         except SyntaxError as e:
@@ -82,4 +87,87 @@ class ShuffleFunctions(ast.NodeTransformer):
             raise RuntimeError(f"Error processing source code: {e}")
 
     def get_refactored_code(self, source_code: str) -> str:
-        return self.reorder_functions(source_code)
\ No newline at end of file
+        return self.reorder_functions(source_code)
+
+    def collect_function_nodes(self, body: List[ast.stmt]) -> List[Tuple[ast.AST, Optional[ast.AST]]]:
+        function_nodes = []
+        for idx, stmt in enumerate(body):
+            if isinstance(stmt, ast.FunctionDef):
+                docstring = None
+                if (idx + 1 < len(body) and
+                    isinstance(body[idx + 1], ast.Expr) and
+                    isinstance(body[idx + 1].value, ast.Constant) and
+                    isinstance(body[idx + 1].value.value, str)):
+                    docstring = body[idx + 1]
+                function_nodes.append((stmt, docstring))
+        return function_nodes
+
+    def collect_nested_classes(self, node: ast.AST, found: List[ast.ClassDef]) -> List[ast.ClassDef]:
+        # Classes generic_visit would reach from this statement, in visiting order.
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, ast.ClassDef):
+                found.append(child)
+            else:
+                self.collect_nested_classes(child, found)
+        return found
+
+    def collect_containers(self, node: ast.AST, containers: Dict) -> Dict:
+        function_nodes = self.collect_function_nodes(node.body)
+        nested = {}
+        if function_nodes:
+            for stmt in node.body:
+                classes = [stmt] if isinstance(stmt, ast.ClassDef) else self.collect_nested_classes(stmt, [])
+                if classes:
+                    nested[stmt] = classes
+                    for class_node in classes:
+                        self.collect_containers(class_node, containers)
+        containers[node] = (function_nodes, nested)
+        return containers
+
+    def apply_shuffle(self, node: ast.AST, containers: Dict, rng: random.Random, saved: List) -> None:
+        function_nodes, nested = containers[node]
+        if not function_nodes:
+            return
+        function_nodes = list(function_nodes)
+        rng.shuffle(function_nodes)
+
+        new_body = []
+        function_idx = 0
+        for stmt in node.body:
+            if isinstance(stmt, ast.FunctionDef):
+                new_body.append(function_nodes[function_idx][0])
+                if function_nodes[function_idx][1]:
+                    new_body.append(function_nodes[function_idx][1])
+                function_idx += 1
+            else:
+                new_body.append(stmt)
+
+        saved.append((node, node.body))
+        node.body = new_body
+        for stmt in new_body:
+            for class_node in nested.get(stmt, ()):
+                self.apply_shuffle(class_node, containers, rng, saved)
+
+    def generate_variants(self, source_code: str, k: int, seed: int = 0) -> List[Tuple[int, str]]:
+        """Return ``k`` shuffled variants as ``(variant_seed, code)`` pairs from one parse.
+
+        The function groups of every module/class body are collected once;
+        each variant only swaps body lists, unparses and restores them.
+        Variant ``i`` equals ``get_refactored_code`` run after
+        ``random.seed(variant_seed(seed, i))``.
+        """
+        try:
+            tree = ast.parse(source_code)
+        except SyntaxError as e:
+            raise ValueError(f"Syntax error in source code: {e}")
+        containers = self.collect_containers(tree, {})
+
+        variants = []
+        for index in range(k):
+            current_seed = variant_seed(seed, index)
+            saved = []
+            self.apply_shuffle(tree, containers, random.Random(current_seed), saved)
+            variants.append((current_seed, ast.unparse(tree)))
+            for node, body in reversed(saved):
+                node.body = body
+        return variants
\ No newline at end of file
@@ -0,0 +1,97 @@
+import csv
+import json
+import os
+import time
+
+from score_cache import METRICS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+RESULT_FIELDS = ["source", "target", "pipeline", "source_sha", "target_sha", *METRICS, "engine", "cached",
+                 "seconds", "error"]
+
+
+def detect_format(path):
+    extension = os.path.splitext(path.rstrip("/\\"))[1].lower()
+    return {".csv": "csv", ".parquet": "parquet"}.get(extension, "jsonl")
+
+
+def parquet_schema():
+    types = {"cached": pa.bool_(), "seconds": pa.float64(), **{metric: pa.float64() for metric in METRICS}}
+    return pa.schema([(field, types.get(field, pa.string())) for field in RESULT_FIELDS])
+
+
+class ResultSink:
+    """One row per scored pair, written as it arrives to CSV, JSONL or Parquet.
+
+    CSV and JSONL rows are flushed to disk every ``flush_every`` rows. A
+    Parquet sink is a directory that gets one part file per flush, so an
+    interrupted run still leaves every completed part readable. With
+    ``append=True`` an existing sink is extended instead of replaced.
+    """
+
+    def __init__(self, path, flush_every=1000, append=False):
+        self.path = path
+        self.format = detect_format(path)
+        self.flush_every = flush_every
+        self.rows = 0
+        self.unflushed = 0
+        self.pending = []
+        if self.format == "parquet":
+            if pa is None:
+                raise ImportError("Parquet output needs pyarrow: pip install pyarrow")
+            os.makedirs(path, exist_ok=True)
+            if not append:
+                for name in os.listdir(path):
+                    if name.startswith("part-") and name.endswith(".parquet"):
+                        os.remove(os.path.join(path, name))
+            self.schema = parquet_schema()
+            self.run_id = time.strftime("%Y%m%d%H%M%S")
+            self.parts = 0
+            return
+
+        has_rows = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8', newline='')
+        if self.format == "csv":
+            self.writer = csv.DictWriter(self.file, fieldnames=RESULT_FIELDS)
+            if not has_rows:
+                self.writer.writeheader()
+
+    def write(self, row):
+        row = {field: row.get(field) for field in RESULT_FIELDS}
+        if self.format == "parquet":
+            self.pending.append(row)
+        elif self.format == "csv":
+            self.writer.writerow(row)
+        else:
+            self.file.write(json.dumps(row) + "\n")
+        self.rows += 1
+        self.unflushed += 1
+        if self.unflushed >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self.format == "parquet":
+            if self.pending:
+                part = os.path.join(self.path, f"part-{self.run_id}-{os.getpid()}-{self.parts:05d}.parquet")
+                pq.write_table(pa.Table.from_pylist(self.pending, schema=self.schema), part)
+                self.parts += 1
+            self.pending = []
+        else:
+            self.file.flush()
+        self.unflushed = 0
+
+    def close(self):
+        self.flush()
+        if self.format != "parquet":
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
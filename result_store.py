@@ -0,0 +1,132 @@
+import argparse
+import sqlite3
+import time
+
+from corpus_index import VARIANT_PATTERN
+
+DEFAULT_RESULT_STORE = "results.sqlite"
+RESULT_COLUMNS = ["source", "variant", "stage", "pipeline", "status", "result", "details", "seconds", "source_sha",
+                  "variant_sha", "run_id", "recorded_at"]
+
+
+def pipeline_number(variant):
+    match = VARIANT_PATTERN.match(f"{variant}.py")
+    return int(match.group(1)) if match else None
+
+
+class ResultStore:
+    """One row per (source, variant, stage) holding the latest verdict.
+
+    Rows carry status, details, duration and the sha256 of the files the
+    verdict was made on. ``add`` buffers them and one ``executemany`` per
+    ``flush_every`` rows writes them, replacing the previous verdict for the
+    same key.
+    """
+
+    def __init__(self, path=DEFAULT_RESULT_STORE, run_id=None, flush_every=500):
+        self.path = path
+        self.run_id = run_id or time.strftime("%Y%m%d%H%M%S")
+        self.flush_every = flush_every
+        self.pending = []
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "source TEXT NOT NULL, variant TEXT NOT NULL, stage TEXT NOT NULL, pipeline INTEGER, "
+            "status TEXT NOT NULL, result INTEGER, details TEXT, seconds REAL, source_sha TEXT, variant_sha TEXT, "
+            "run_id TEXT, recorded_at REAL, PRIMARY KEY (source, variant, stage))"
+        )
+
+    def add(self, source, variant, stage, status, result=None, details="", seconds=None, source_sha=None,
+            variant_sha=None):
+        self.pending.append((source, variant, stage, pipeline_number(variant), status,
+                             None if result is None else int(bool(result)), details, seconds, source_sha, variant_sha,
+                             self.run_id, time.time()))
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def add_record(self, record):
+        self.add(**record)
+
+    def flush(self):
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO results ({', '.join(RESULT_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(RESULT_COLUMNS))})", self.pending
+            )
+        self.pending = []
+
+    def pass_rate_by_pipeline(self, stage="tests", run_id=None):
+        """[(pipeline, passed, total, rate)] over the variant rows of ``stage``."""
+        self.flush()
+        query = ("SELECT pipeline, SUM(status = 'PASS'), COUNT(*) FROM results "
+                 "WHERE stage = ? AND pipeline IS NOT NULL")
+        params = [stage]
+        if run_id:
+            query += " AND run_id = ?"
+            params.append(run_id)
+        rows = self.conn.execute(query + " GROUP BY pipeline ORDER BY pipeline", params)
+        return [(pipeline, passed, total, passed / total) for pipeline, passed, total in rows]
+
+    def slowest_modules(self, limit=10, stage=None, run_id=None):
+        """[(source, total seconds, rows)] ordered by time spent, slowest first."""
+        self.flush()
+        query = "SELECT source, SUM(seconds), COUNT(*) FROM results WHERE seconds IS NOT NULL"
+        params = []
+        if stage:
+            query += " AND stage = ?"
+            params.append(stage)
+        if run_id:
+            query += " AND run_id = ?"
+            params.append(run_id)
+        query += " GROUP BY source ORDER BY SUM(seconds) DESC LIMIT ?"
+        return list(self.conn.execute(query, params + [limit]))
+
+    def status_counts(self, run_id=None):
+        self.flush()
+        query = "SELECT status, COUNT(*) FROM results"
+        params = []
+        if run_id:
+            query += " WHERE run_id = ?"
+            params.append(run_id)
+        return dict(self.conn.execute(query + " GROUP BY status ORDER BY status", params))
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def print_summary(store, stage="tests", limit=10, run_id=None):
+    print("Status counts:")
+    for status, count in store.status_counts(run_id).items():
+        print(f"  {status}: {count}")
+    print(f"Pass rate per pipeline ({stage}):")
+    for pipeline, passed, total, rate in store.pass_rate_by_pipeline(stage, run_id):
+        print(f"  PipNo_{pipeline}: {passed}/{total} ({rate:.1%})")
+    print("Slowest modules:")
+    for source, seconds, rows in store.slowest_modules(limit, run_id=run_id):
+        print(f"  {source}: {seconds:.2f}s over {rows} results")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the test result store.")
+    parser.add_argument("--store", default=DEFAULT_RESULT_STORE)
+    parser.add_argument("--stage", default="tests")
+    parser.add_argument("--limit", type=int, default=10, help="How many of the slowest modules to list")
+    parser.add_argument("--run-id", default=None, help="Only count rows written by this run")
+    args = parser.parse_args()
+
+    with ResultStore(args.store) as store:
+        print_summary(store, args.stage, args.limit, args.run_id)
+
+
+if __name__ == "__main__":
+    main()
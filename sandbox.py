@@ -0,0 +1,183 @@
+import multiprocessing
+import signal
+import time
+from collections import deque
+from multiprocessing.connection import wait
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+OK = "ok"
+ERROR = "error"
+TIMEOUT = "timeout"
+CPU_LIMIT = "cpu_limit"
+MEMORY_LIMIT = "memory_limit"
+CRASHED = "crashed"
+LIMIT_OUTCOMES = (TIMEOUT, CPU_LIMIT, MEMORY_LIMIT, CRASHED)
+
+_worker = {}
+
+
+class CpuLimitExceeded(Exception):
+    pass
+
+
+def cpu_used():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def set_cpu_budget(seconds):
+    # Soft limit only: the kernel sends SIGXCPU when it is passed, and the
+    # hard limit stays where it was so the budget can be moved again.
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = resource.RLIM_INFINITY if seconds is None else int(cpu_used() + seconds) + 1
+    if hard != resource.RLIM_INFINITY and (soft == resource.RLIM_INFINITY or soft > hard):
+        soft = hard
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def on_cpu_limit(signum, frame):
+    # Give whatever runs next a fresh budget, so one runaway call inside a
+    # longer task (a test in a pytest session) does not starve the rest.
+    set_cpu_budget(_worker["cpu_seconds"])
+    raise CpuLimitExceeded(f"CPU time limit of {_worker['cpu_seconds']}s exceeded")
+
+
+def worker_main(conn, memory_bytes, cpu_seconds):
+    _worker["cpu_seconds"] = cpu_seconds
+    if resource is not None:
+        if memory_bytes:
+            _, hard = resource.getrlimit(resource.RLIMIT_AS)
+            resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, hard))
+        if cpu_seconds:
+            signal.signal(signal.SIGXCPU, on_cpu_limit)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        func, args = task
+        if cpu_seconds and resource is not None:
+            set_cpu_budget(cpu_seconds)
+        try:
+            # A task that catches CpuLimitExceeded itself (pytest records it as a
+            # failed test) decides what the hit means and still returns ok.
+            outcome, value = OK, func(*args)
+        except CpuLimitExceeded:
+            outcome, value = CPU_LIMIT, None
+        except MemoryError:
+            outcome, value = MEMORY_LIMIT, None
+        except BaseException as e:
+            outcome, value = ERROR, f"{type(e).__name__}: {e}"
+        finally:
+            if cpu_seconds and resource is not None:
+                set_cpu_budget(None)
+        try:
+            conn.send((outcome, value))
+        except MemoryError:
+            conn.send((MEMORY_LIMIT, None))
+
+
+class Sandbox:
+    """Pre-forked worker processes that run tasks under resource limits.
+
+    Each worker caps its address space at ``memory_mb`` (RLIMIT_AS) once at
+    start and gets a fresh CPU budget of ``cpu_seconds`` per task. The parent
+    enforces ``wall_seconds`` and kills and replaces a worker that overruns
+    it or dies. Every task ends with one of the outcomes ok, error, timeout,
+    cpu_limit, memory_limit or crashed; only ok carries the task's return
+    value. Memory and CPU limits need the ``resource`` module (POSIX).
+    """
+
+    def __init__(self, workers=1, memory_mb=None, cpu_seconds=None, wall_seconds=None):
+        methods = multiprocessing.get_all_start_methods()
+        self.context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        self.memory_bytes = memory_mb * 1024 * 1024 if memory_mb else None
+        self.cpu_seconds = cpu_seconds
+        self.wall_seconds = wall_seconds
+        self.workers = [self.spawn() for _ in range(max(1, workers))]
+
+    def spawn(self):
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(target=worker_main, args=(child_conn, self.memory_bytes, self.cpu_seconds),
+                                       daemon=True)
+        process.start()
+        child_conn.close()
+        return {"process": process, "conn": parent_conn}
+
+    def replace(self, slot):
+        worker = self.workers[slot]
+        if worker["process"].is_alive():
+            worker["process"].kill()
+        worker["process"].join()
+        worker["conn"].close()
+        self.workers[slot] = self.spawn()
+
+    def death_outcome(self, slot):
+        process = self.workers[slot]["process"]
+        process.join()
+        if resource is not None and process.exitcode == -signal.SIGXCPU:
+            return CPU_LIMIT
+        return CRASHED
+
+    def map(self, func, arg_tuples, wall_seconds=None):
+        """Run ``func(*args)`` for every tuple; returns [(outcome, value)] in input order."""
+        wall_seconds = wall_seconds if wall_seconds is not None else self.wall_seconds
+        pending = deque(enumerate(arg_tuples))
+        results = [None] * len(pending)
+        idle = deque(range(len(self.workers)))
+        busy = {}  # slot -> (task index, deadline)
+        while pending or busy:
+            while pending and idle:
+                slot = idle.popleft()
+                index, args = pending.popleft()
+                self.workers[slot]["conn"].send((func, tuple(args)))
+                busy[slot] = (index, time.monotonic() + wall_seconds if wall_seconds else None)
+
+            deadlines = [deadline for _, deadline in busy.values() if deadline is not None]
+            timeout = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+            ready = wait([self.workers[slot]["conn"] for slot in busy], timeout)
+            for slot in list(busy):
+                index, deadline = busy[slot]
+                if self.workers[slot]["conn"] in ready:
+                    try:
+                        results[index] = self.workers[slot]["conn"].recv()
+                    except (EOFError, OSError):
+                        results[index] = (self.death_outcome(slot), None)
+                        self.replace(slot)
+                elif deadline is not None and time.monotonic() >= deadline:
+                    results[index] = (TIMEOUT, None)
+                    self.replace(slot)
+                else:
+                    continue
+                del busy[slot]
+                idle.append(slot)
+        return results
+
+    def run(self, func, *args, wall_seconds=None):
+        return self.map(func, [args], wall_seconds)[0]
+
+    def close(self):
+        for worker in self.workers:
+            try:
+                worker["conn"].send(None)
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker["process"].join(timeout=1)
+            if worker["process"].is_alive():
+                worker["process"].kill()
+                worker["process"].join()
+            worker["conn"].close()
+        self.workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,92 @@
+import json
+import sqlite3
+from importlib import metadata
+
+DEFAULT_SCORE_CACHE = "codebleu_cache.sqlite"
+METRICS = ["codebleu", "ngram_match_score", "weighted_ngram_match_score", "syntax_match_score",
+           "dataflow_match_score"]
+# Stay well below SQLite's default limit on host parameters per statement.
+LOOKUP_CHUNK = 500
+
+
+def codebleu_version():
+    try:
+        return metadata.version("codebleu")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+class ScoreCache:
+    """CodeBLEU scores keyed by (reference sha, prediction sha, lang, weights, codebleu version).
+
+    Lookups go through ``get_many`` so a whole batch of pairs costs a handful
+    of queries; new scores are buffered by ``add`` and written with one
+    ``executemany`` per ``flush_every`` rows.
+    """
+
+    def __init__(self, path=DEFAULT_SCORE_CACHE, version=None, flush_every=500):
+        self.path = path
+        self.version = version or codebleu_version()
+        self.flush_every = flush_every
+        self.pending = []
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            "ref_sha TEXT NOT NULL, pred_sha TEXT NOT NULL, lang TEXT NOT NULL, weights TEXT NOT NULL, "
+            "version TEXT NOT NULL, " + ", ".join(f"{metric} REAL" for metric in METRICS) + ", "
+            "PRIMARY KEY (ref_sha, pred_sha, lang, weights, version))"
+        )
+
+    @staticmethod
+    def weights_key(weights):
+        return json.dumps([float(weight) for weight in weights])
+
+    def get_many(self, pairs, lang, weights):
+        """Return {(ref_sha, pred_sha): metrics} for the cached entries among ``pairs``."""
+        weights = self.weights_key(weights)
+        pairs = list(dict.fromkeys(pairs))
+        found = {}
+        for start in range(0, len(pairs), LOOKUP_CHUNK):
+            chunk = pairs[start:start + LOOKUP_CHUNK]
+            # Filter on the reference side in SQL, then match the exact pairs here.
+            refs = list({ref_sha for ref_sha, _ in chunk})
+            wanted = set(chunk)
+            rows = self.conn.execute(
+                f"SELECT ref_sha, pred_sha, {', '.join(METRICS)} FROM scores "
+                f"WHERE lang = ? AND weights = ? AND version = ? AND ref_sha IN ({', '.join('?' * len(refs))})",
+                [lang, weights, self.version, *refs],
+            )
+            for ref_sha, pred_sha, *scores in rows:
+                if (ref_sha, pred_sha) in wanted:
+                    found[(ref_sha, pred_sha)] = dict(zip(METRICS, scores))
+        self.hits += len(found)
+        self.misses += len(pairs) - len(found)
+        return found
+
+    def add(self, ref_sha, pred_sha, lang, weights, result):
+        self.pending.append((ref_sha, pred_sha, lang, self.weights_key(weights), self.version,
+                             *(result[metric] for metric in METRICS)))
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO scores VALUES ({', '.join('?' * (5 + len(METRICS)))})", self.pending
+            )
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
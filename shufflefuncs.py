@@ -1,6 +1,9 @@
 import ast
+import random
 from random import shuffle
 
+from hashing import variant_seed
+
 class ShuffleFunctions(ast.NodeTransformer):
     def shuffle_functions(self, tree):
         self.module_node = None
@@ -72,8 +75,11 @@ class ShuffleFunctions(ast.NodeTransformer):
         self.module_node.body = new_body
         return tree
 
+    def transform_tree(self, tree):
+        return self.shuffle_functions(tree)
+
     def reorder_functions(self, tree):
-        tree = self.shuffle_functions(tree)
+        tree = self.transform_tree(tree)
         ast.fix_missing_locations(tree)
         return ast.unparse(tree)
 
@@ -84,3 +90,57 @@ class ShuffleFunctions(ast.NodeTransformer):
         except SyntaxError as e:
             raise ValueError(f"Syntax error in source code: {e}")
 
+    def generate_variants(self, source_code, k, seed=0):
+        """Return ``k`` shuffled variants as ``(variant_seed, code)`` pairs from one parse.
+
+        Variant ``i`` equals ``get_refactored_code`` run after
+        ``random.seed(variant_seed(seed, i))``, minus the order printout.
+        """
+        try:
+            tree = ast.parse(source_code)
+        except SyntaxError as e:
+            raise ValueError(f"Syntax error in source code: {e}")
+
+        # Collect groups exactly as shuffle_functions does, but only once.
+        original_body = tree.body
+        self.function_groups = []
+        self.doc_assignments = {}
+        self.seen_functions = set()
+        for stmt in original_body:
+            if self.is_doc_assignment(stmt):
+                self.doc_assignments.setdefault(stmt.targets[0].value.id, []).append(stmt)
+        for stmt in original_body:
+            if isinstance(stmt, ast.FunctionDef) and stmt.name not in self.seen_functions:
+                self.seen_functions.add(stmt.name)
+                self.function_groups.append((stmt, self.doc_assignments.get(stmt.name, [])))
+        remaining = [
+            stmt for stmt in original_body
+            if not (self.is_doc_assignment(stmt) and stmt.targets[0].value.id in self.doc_assignments)
+            and not (isinstance(stmt, ast.FunctionDef) and stmt.name in self.seen_functions)
+        ]
+
+        variants = []
+        for index in range(k):
+            current_seed = variant_seed(seed, index)
+            if not self.function_groups:
+                variants.append((current_seed, ast.unparse(tree)))
+                continue
+            groups = list(self.function_groups)
+            random.Random(current_seed).shuffle(groups)
+            new_body = []
+            for func_node, related_nodes in groups:
+                new_body.append(func_node)
+                new_body.extend(related_nodes)
+            tree.body = new_body + remaining
+            variants.append((current_seed, ast.unparse(tree)))
+        tree.body = original_body
+        return variants
+
+    @staticmethod
+    def is_doc_assignment(stmt):
+        return (isinstance(stmt, ast.Assign) and
+                len(stmt.targets) == 1 and
+                isinstance(stmt.targets[0], ast.Attribute) and
+                isinstance(stmt.targets[0].value, ast.Name) and
+                stmt.targets[0].attr == '__doc__')
+
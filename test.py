@@ -1,20 +1,32 @@
+import argparse
 import os
 import subprocess
 import sys
-import glob
 import ast
 import re
+import time
 
-RESULT_LOG = "tests_result.txt"
+import instrument
+from corpus_index import CorpusIndex
+from hashing import file_hash
+from manifest import Manifest, inputs_digest
+from parse_cache import ParseCache
+from result_store import ResultStore, print_summary
 
-def log_result(source_module, target_module, result, status):
-    with open(RESULT_LOG, 'a', encoding='utf-8') as f:
-        f.write(f"[SRC→REF] Source: {source_module} | Target: {target_module} | Result: {status}\n")
+PARSE_CACHE = ParseCache()
+MANIFEST = Manifest()
+MANIFEST_STAGE = "tests"
+HARNESS_HASH = file_hash(__file__)
+RESULTS = ResultStore()
+
+def log_result(source_module, target_module, result, status, seconds=None, variant_file=None, source_sha=None):
+    RESULTS.add(source_module, target_module, "tests", status, result, seconds=seconds, source_sha=source_sha,
+                variant_sha=file_hash(variant_file) if variant_file and os.path.exists(variant_file) else None)
 
 def has_func_or_class(file_path):
     try:
         with open(file_path, 'r') as f:
-            tree = ast.parse(f.read(), filename=file_path)
+            tree = PARSE_CACHE.get_tree(f.read(), filename=file_path)
             return any(isinstance(node, (ast.FunctionDef, ast.ClassDef)) for node in ast.walk(tree))
     except Exception as e:
         print(f"Error parsing {file_path}: {e}")
@@ -183,43 +195,42 @@ def run_tests(test_file):
         print(f"Test execution failed for {test_file}: {e}")
         return False
 
-def get_files(directory):
-    return [f for f in glob.glob(os.path.join(os.path.abspath(directory), "*.py"))]
-
 def get_mod_name(file_path):
     return os.path.splitext(os.path.basename(file_path))[0]
 
+def pair_digest(source_file, refactored_file):
+    return inputs_digest(file_hash(source_file), file_hash(refactored_file), HARNESS_HASH)
+
+def pending_versions(source_file, refactored_versions):
+    pending = []
+    for refactored_module, refactored_path in refactored_versions:
+        refactored_file = os.path.join(refactored_path, f"{refactored_module}.py")
+        digest = pair_digest(source_file, refactored_file)
+        if not MANIFEST.is_current(MANIFEST_STAGE, refactored_file, digest):
+            pending.append((refactored_module, refactored_path))
+    return pending
+
 SOURCE_DIR = './test/source'
 REF_OUT_DIR = './test/target'
 
-with open(RESULT_LOG, 'w', encoding='utf-8') as f:
-    f.write("Test Results Log\n")
-    f.write("=" * 60 + "\n")
+parser = argparse.ArgumentParser(description="Generate tests per source module and check every PipNo variant in turn.")
+instrument.add_argument(parser)
+args = parser.parse_args()
+instrument.enable(args.instrument is not None)
 
 make_dirs('./tests/source_tests', './pynguin-report')
 
-source_files = get_files(SOURCE_DIR)
+index = CorpusIndex(SOURCE_DIR, REF_OUT_DIR)
+source_files = [os.path.abspath(index.source_path(name)) for name in index.sources]
 print(f"Source files found: {source_files}")
 
-refactored_dirs = [d for d in glob.glob(os.path.join(REF_OUT_DIR, '*')) if os.path.isdir(d)]
+refactored_dirs = [index.variant_dir(name) for name, variants in index.sources.items() if variants is not None]
 print(f"Refactored directories found: {refactored_dirs}")
 
 file_mapping = {}
-for source_file in source_files:
-    source_module = get_mod_name(source_file)
-    source_base = os.path.basename(source_file).replace('.py', '')
-    refactored_versions = []
-    source_dir = os.path.join(REF_OUT_DIR, source_base)
-    if os.path.exists(source_dir):
-        
-        for pip_no in range(1, 5):  
-            ref_file = os.path.join(source_dir, f"PipNo_{pip_no}_{source_base}.py")
-            if os.path.exists(ref_file):
-                refactored_versions.append((f"PipNo_{pip_no}_{source_base}", os.path.dirname(ref_file)))
-    file_mapping[source_module] = refactored_versions
-
-with open('filemap.txt', 'a') as f:
-    f.write(str(file_mapping) + "\n")
+for name in index.sources:
+    file_mapping[get_mod_name(name)] = [(variant_module, os.path.dirname(variant_path))
+                                        for _, variant_module, variant_path in index.variants(name) or []]
 print(f"File mapping: {file_mapping}")
 
 all_tests_pass = True
@@ -229,8 +240,13 @@ for source_file in source_files:
         print(f"File doesn't have testable usecases: {source_file}")
         continue
     module_name = get_mod_name(source_file)
+    test_file = os.path.join('./tests/source_tests', f"test_{module_name}.py")
+    if os.path.exists(test_file) and not pending_versions(source_file, file_mapping.get(module_name, [])):
+        print(f"All refactored versions of {module_name} are unchanged. Skipping test generation.")
+        continue
     print(f"Generating tests for source module: {module_name}")
-    run_pynguin(SOURCE_DIR, './tests/source_tests', module_name)
+    with instrument.timed("run_pynguin", file=source_file):
+        run_pynguin(SOURCE_DIR, './tests/source_tests', module_name)
 
 # *** Modified: Run tests against all refactored versions ***
 for source_file in source_files:
@@ -242,12 +258,13 @@ for source_file in source_files:
         continue
 
     test_file = os.path.join('./tests/source_tests', f"test_{source_module}.py")
+    source_sha = file_hash(source_file)
     print(f"\n=== Testing {source_module} against refactored versions ===")
 
     if not os.path.exists(test_file):
         print(f"Test file {test_file} not found. Skipping.")
         for ref_module, _ in refactored_versions:
-            log_result(source_module, ref_module, False, "FAIL (Missing Test)")
+            log_result(source_module, ref_module, False, "FAIL (Missing Test)", source_sha=source_sha)
         all_tests_pass = False
         continue
 
@@ -255,27 +272,47 @@ for source_file in source_files:
         refactored_module_path = os.path.join(refactored_path, f"{refactored_module}.py")
         if not os.path.exists(refactored_module_path):
             print(f"Refactored module {refactored_module_path} not found. Skipping.")
-            log_result(source_module, refactored_module, False, "FAIL (Missing Refactored Module)")
+            log_result(source_module, refactored_module, False, "FAIL (Missing Refactored Module)",
+                       source_sha=source_sha)
             all_tests_pass = False
             continue
 
+        digest = pair_digest(source_file, refactored_module_path)
+        if MANIFEST.is_current(MANIFEST_STAGE, refactored_module_path, digest):
+            entry = MANIFEST.get(MANIFEST_STAGE, refactored_module_path)
+            print(f"Unchanged since last run: {source_module} -> {refactored_module} ({entry['status']})")
+            log_result(source_module, refactored_module, entry["result"], entry["status"],
+                       variant_file=refactored_module_path, source_sha=source_sha)
+            all_tests_pass = all_tests_pass and entry["result"]
+            continue
+
         print(f"Running tests on refactored: {refactored_module}")
-        if not modify_imports(test_file, refactored_path, source_module, refactored_module):
-            log_result(source_module, refactored_module, False, "FAIL (Import Modification)")
+        with instrument.timed("modify_imports", file=refactored_module_path):
+            modified = modify_imports(test_file, refactored_path, source_module, refactored_module)
+        if not modified:
+            log_result(source_module, refactored_module, False, "FAIL (Import Modification)", source_sha=source_sha)
             all_tests_pass = False
             continue
+        started = time.perf_counter()
         refactored_result = run_tests(test_file)
+        seconds = time.perf_counter() - started
+        instrument.record("run_tests", seconds, file=refactored_module_path)
 
         if refactored_result:
             print(f"Behavior matches expected (source-derived) for {source_module} -> {refactored_module}")
-            log_result(source_module, refactored_module, True, "PASS")
+            log_result(source_module, refactored_module, True, "PASS", seconds, refactored_module_path, source_sha)
         else:
             print(f"Behavior mismatch for {source_module} -> {refactored_module}")
-            log_result(source_module, refactored_module, False, "FAIL")
+            log_result(source_module, refactored_module, False, "FAIL", seconds, refactored_module_path, source_sha)
             all_tests_pass = False
+        MANIFEST.record(MANIFEST_STAGE, refactored_module_path, digest,
+                        result=refactored_result, status="PASS" if refactored_result else "FAIL")
+
+MANIFEST.save()
+print_summary(RESULTS, run_id=RESULTS.run_id)
+RESULTS.close()
+if args.instrument:
+    instrument.report(args.instrument)
 
-summary = "\nAll SRC→REF tests passed." if all_tests_pass else "\nSome SRC→REF tests failed or were skipped. Check 'tests_result.txt' for details."
+summary = "\nAll SRC→REF tests passed." if all_tests_pass else f"\nSome SRC→REF tests failed or were skipped. Check '{RESULTS.path}' for details."
 print(summary)
-with open(RESULT_LOG, 'a', encoding='utf-8') as f:
-    f.write("=" * 60 + "\n")
-    f.write(summary + "\n")
@@ -1,20 +1,65 @@
+import argparse
 import os
 import subprocess
 import sys
-import glob
+import time
 import ast
 import re
-
-RESULT_LOG = "tests_result.txt"
-
-def log_result(source_module, target_module, result, status, details=""):
-    with open(RESULT_LOG, 'a', encoding='utf-8') as f:
-        f.write(f"[SRC→REF] Source: {source_module} | Target: {target_module} | Result: {status} | Details: {details}\n")
+from concurrent.futures import ProcessPoolExecutor
+
+import instrument
+from corpus_index import CorpusIndex
+from fingerprint import file_fingerprint
+from hashing import file_hash
+from manifest import Manifest, inputs_digest
+from parse_cache import ParseCache
+from pynguin_cache import PynguinCache
+from result_store import DEFAULT_RESULT_STORE, ResultStore, print_summary
+from sandbox import LIMIT_OUTCOMES, OK, TIMEOUT, Sandbox
+from validity import validate_pairs
+from variant_session import FAILED, PASSED, pytest_session, read_durations, read_outcomes, write_session
+
+PARSE_CACHE = ParseCache()
+MANIFEST = Manifest()
+MANIFEST_STAGE = "tests"
+HARNESS_HASH = file_hash(__file__)
+JOBS_DIR = './tests/jobs'
+JOB_TIMEOUT = 3600
+SANDBOX_MEMORY_MB = 2048
+SANDBOX_CPU_SECONDS = 300
+SANDBOX_WALL_SECONDS = 900
+PYNGUIN_ALGORITHM = "DYNAMOSA"
+PYNGUIN_ITERATIONS = 5000
+PYNGUIN_SEED = 0
+TEST_CACHE = PynguinCache(algorithm=PYNGUIN_ALGORITHM, iterations=PYNGUIN_ITERATIONS, seed=PYNGUIN_SEED)
+
+_worker = {}
+
+# Result records of the module job running in this process; written to the result store by main().
+LOG_ENTRIES = []
+
+def log_result(source_module, target_module, result, status, details="", stage="tests", seconds=None,
+               source_sha=None, variant_file=None):
+    LOG_ENTRIES.append({
+        "source": source_module, "variant": target_module, "stage": stage, "status": status, "result": result,
+        "details": details, "seconds": seconds,
+        "source_sha": source_sha,
+        "variant_sha": file_hash(variant_file) if variant_file and os.path.exists(variant_file) else None,
+    })
+
+def time_left(deadline):
+    """Seconds left before the job's deadline, for subprocess timeouts."""
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise subprocess.TimeoutExpired("module job", 0)
+    return left
 
 def has_func_or_class(file_path):
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
-            tree = ast.parse(f.read(), filename=file_path)
+            tree = PARSE_CACHE.get_tree(f.read(), filename=file_path)
             return any(isinstance(node, (ast.FunctionDef, ast.ClassDef)) for node in ast.walk(tree))
     except Exception as e:
         print(f"Error parsing {file_path}: {e}")
@@ -24,7 +69,7 @@ def make_dirs(*dirs):
     for d in dirs:
         os.makedirs(d, exist_ok=True)
 
-def run_pynguin(project_path, output_path, module_name):
+def run_pynguin(project_path, output_path, module_name, deadline=None):
     project_path = os.path.abspath(project_path)
     output_path = os.path.abspath(output_path)
     
@@ -39,15 +84,23 @@ def run_pynguin(project_path, output_path, module_name):
         print(f"Error: No write permission for {output_path}.")
         return False
 
+    source_path = os.path.join(project_path, f"{module_name}.py")
+    test_file = os.path.join(output_path, f"test_{module_name}.py")
+    if TEST_CACHE.fetch(source_path, module_name, test_file):
+        print(f"Reusing cached tests for {module_name}")
+        return True
+
     cmd = [
         sys.executable, 
         "-m", "pynguin",
         "--project-path", project_path,
         "--output-path", output_path,
         "--module-name", module_name,
-        "--maximum-iterations", "5000",
-        "--algorithm", "DYNAMOSA",
+        "--maximum-iterations", str(PYNGUIN_ITERATIONS),
+        "--algorithm", PYNGUIN_ALGORITHM,
+        "--seed", str(PYNGUIN_SEED),
         "--create-coverage-report",
+        "--report-dir", os.path.join(output_path, "pynguin-report"),
         "-v"
     ]
     env = os.environ.copy()
@@ -58,13 +111,14 @@ def run_pynguin(project_path, output_path, module_name):
             env=env,
             check=True,
             stderr=subprocess.PIPE,
-            text=True
+            text=True,
+            timeout=time_left(deadline)
         )
         if process.stderr:
             print(f"Pynguin stderr output: {process.stderr}")
-        test_file = os.path.join(output_path, f"test_{module_name}.py")
         if os.path.exists(test_file):
             if clean_test_file(test_file):
+                TEST_CACHE.store(source_path, module_name, test_file)
                 return True
         print(f"Test file {test_file} not generated by Pynguin.")
         return False
@@ -72,6 +126,9 @@ def run_pynguin(project_path, output_path, module_name):
         print(f"Error: Pynguin failed to generate tests for {project_path}/{module_name}.py: {e}")
         print(f"Pynguin stderr: {e.stderr}")
         return False
+    except subprocess.TimeoutExpired:
+        # The job's deadline has passed; run_module_job logs it as a timed-out job.
+        raise
     except Exception as e:
         print(f"Error in run_pynguin for {module_name}: {e}")
         return False
@@ -124,230 +181,366 @@ def clean_test_file(test_file):
         print(f"Error cleaning test file {test_file}: {e}")
         return False
 
-def modify_imports(test_file, new_path, old_module, new_module):
-    """Modify imports in the test file to point to a new module."""
-    try:
-        module_path = os.path.join(new_path, f"{new_module}.py")
-        if not os.path.exists(module_path):
-            print(f"Error: Module {module_path} does not exist.")
-            return False
-
-        with open(test_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-
-        used_aliases = set()
-        for line in lines:
-            used_aliases.update(re.findall(r'\bmodule_(\d+)', line))
-
-        new_lines = []
-        has_pytest = False
-        for line in lines:
-            if line.strip().startswith('import pytest'):
-                has_pytest = True
-                new_lines.append(line)
-            elif not (line.strip().startswith('import ') or line.strip().startswith('sys.path.insert')):
-                new_lines.append(line)
-
-        formatted_path = os.path.normpath(new_path).replace(os.sep, '/')
-        new_lines.insert(0, "import sys\n")
-        new_lines.insert(1, f'sys.path.insert(0, "{formatted_path}")\n')
-        insert_idx = 2
-        for alias_num in sorted(used_aliases):
-            new_lines.insert(insert_idx, f"import {new_module} as module_{alias_num}\n")
-            insert_idx += 1
-        if not has_pytest:
-            new_lines.insert(insert_idx, "import pytest\n")
-
-        with open(test_file, 'w', encoding='utf-8') as f:
-            f.writelines(new_lines)
-        print(f"Modified imports in {test_file} to use {new_module} from {formatted_path}")
-        return True
-    except Exception as e:
-        print(f"Error modifying imports in {test_file}: {e}")
-        return False
-
-def run_tests(test_file, module_name, is_source=True):
-    """Run pytest on the test file."""
-    try:
-        test_file = os.path.abspath(test_file)
-        with open(test_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-            try:
-                ast.parse(content, filename=test_file)
-            except SyntaxError as e:
-                print(f"Syntax error in test file {test_file}: {e}")
-                with open(test_file, 'r', encoding='utf-8') as f:
-                    print(f"Content of {test_file}:\n{f.read()}\n")
-                log_result(module_name, module_name if is_source else refactored_module, False, "FAIL", f"Syntax error in test file: {e}")
-                return False
-
-            if 'import pytest' not in content:
-                print(f"Error: 'import pytest' missing in {test_file}.")
-                log_result(module_name, module_name if is_source else refactored_module, False, "FAIL", "Missing pytest import")
-                return False
-            used_aliases = set(re.findall(r'\bmodule_(\d+)', content))
-            for alias_num in used_aliases:
-                if f'import ' not in content or f' as module_{alias_num}' not in content:
-                    print(f"Error: 'import ... as module_{alias_num}' missing in {test_file}.")
-                    log_result(module_name, module_name if is_source else refactored_module, False, "FAIL", f"Missing import for module_{alias_num}")
-                    return False
-
-        # Validate source module for source tests
-        if is_source:
-            source_module_path = os.path.join(SOURCE_DIR, f"{module_name}.py")
-            if not os.path.exists(source_module_path):
-                print(f"Error: Source module {source_module_path} does not exist.")
-                log_result(module_name, module_name, False, "FAIL", f"Source module {source_module_path} missing")
-                return False
-            try:
-                with open(source_module_path, 'r', encoding='utf-8') as f:
-                    ast.parse(f.read(), filename=source_module_path)
-            except SyntaxError as e:
-                print(f"Syntax error in source module {source_module_path}: {e}")
-                with open(source_module_path, 'r', encoding='utf-8') as f:
-                    print(f"Content of {source_module_path}:\n{f.read()}\n")
-                log_result(module_name, module_name, False, "FAIL", f"Syntax error in source module: {e}")
-                return False
-
-        cmd = [sys.executable, "-m", "pytest", test_file, "-v", "--tb=short"]
-        print(f"Pytest command: {' '.join(cmd)}")
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        print(f"Pytest stdout: {result.stdout}")
-        if result.stderr:
-            print(f"Pytest stderr: {result.stderr}")
-        return result.returncode == 0
-    except subprocess.CalledProcessError as e:
-        print(f"Test execution failed for {test_file}. Return code: {e.returncode}")
-        print(f"Pytest stderr: {e.stderr}")
-        with open(test_file, 'r', encoding='utf-8') as f:
-            print(f"Content of {test_file}:\n{f.read()}\n")
-        if is_source:
-            source_module_path = os.path.join(SOURCE_DIR, f"{module_name}.py")
-            if os.path.exists(source_module_path):
-                with open(source_module_path, 'r', encoding='utf-8') as f:
-                    print(f"Content of {source_module_path}:\n{f.read()}\n")
-        log_result(module_name, module_name if is_source else refactored_module, False, "FAIL", f"Pytest failed with return code {e.returncode}: {e.stderr}")
-        return False
-    except Exception as e:
-        print(f"Error running tests for {test_file}: {e}")
-        log_result(module_name, module_name if is_source else refactored_module, False, "FAIL", f"Unexpected error: {e}")
-        return False
-
-def get_files(directory):
-    """Get all Python files in the directory."""
-    return [f for f in glob.glob(os.path.join(os.path.abspath(directory), "*.py"))]
+def get_sandbox(options):
+    """The sandbox worker of this process, started on first use and reused by later jobs."""
+    if "sandbox" not in _worker:
+        _worker["sandbox"] = Sandbox(workers=1, memory_mb=options["memory_mb"], cpu_seconds=options["cpu_seconds"])
+    return _worker["sandbox"]
+
+def run_session(session_file, junit_file, variants, deadline, options):
+    """Run the variant session once in the sandbox.
+
+    Returns (session outcome, {variant: outcome}, {variant: seconds}). The
+    session outcome is a sandbox limit when the whole run was cut short;
+    every variant then carries it too.
+    """
+    session_file = os.path.abspath(session_file)
+    junit_file = os.path.abspath(junit_file)
+    if os.path.exists(junit_file):
+        os.remove(junit_file)
+    # No cache provider: jobs running side by side would share .pytest_cache.
+    args = [session_file, "-q", "--tb=short", "-p", "no:cacheprovider", f"--junitxml={junit_file}"]
+    if options["variant_workers"]:
+        args += ["-n", str(options["variant_workers"])]
+    print(f"Pytest arguments: {' '.join(args)}")
+    left = time_left(deadline)
+    job_bound = left is not None and (not options["wall_seconds"] or left < options["wall_seconds"])
+    wall_seconds = left if job_bound else options["wall_seconds"]
+    with instrument.timed("run_session", len(variants)):
+        outcome, exit_code = get_sandbox(options).run(pytest_session, args, wall_seconds=wall_seconds)
+    if outcome == TIMEOUT and job_bound:
+        # The job deadline, not the per-session limit, ran out.
+        raise subprocess.TimeoutExpired("pytest session", wall_seconds)
+    if outcome in LIMIT_OUTCOMES:
+        print(f"Pytest session for {session_file} stopped: {outcome}")
+        return outcome, dict.fromkeys(variants, outcome), dict.fromkeys(variants, wall_seconds)
+    if outcome != OK or not os.path.exists(junit_file):
+        print(f"Pytest wrote no report for {session_file}. Outcome: {outcome} {exit_code}")
+        return outcome, dict.fromkeys(variants, FAILED), dict.fromkeys(variants)
+    return outcome, read_outcomes(junit_file, variants), read_durations(junit_file, variants)
+
+def run_variants(test_file, module_name, variants, job_dir, deadline, options):
+    """({variant: outcome}, {variant: seconds}) for one session over ``variants``.
+
+    Returns None if the tests never import the module.
+
+    When a session as a whole hits a limit, each variant is run again on
+    its own so the one that hangs or crashes does not take the rest with it.
+    """
+    session_file = os.path.join(job_dir, f"test_{module_name}_variants.py")
+    with instrument.timed("write_session", len(variants)):
+        written = write_session(test_file, session_file, module_name, variants, os.path.abspath(SOURCE_DIR))
+    if not written:
+        return None
+    outcome, outcomes, durations = run_session(session_file, os.path.join(job_dir, f"{module_name}_junit.xml"), variants,
+                                    deadline, options)
+    if outcome in LIMIT_OUTCOMES and len(variants) > 1:
+        for name, path in variants.items():
+            session_file = os.path.join(job_dir, f"test_{module_name}_only_{name}.py")
+            with instrument.timed("write_session"):
+                write_session(test_file, session_file, module_name, {name: path}, os.path.abspath(SOURCE_DIR))
+            _, single, seconds = run_session(session_file, os.path.join(job_dir, f"{name}_junit.xml"),
+                                             {name: path}, deadline, options)
+            outcomes[name] = single[name]
+            durations[name] = seconds[name]
+    return outcomes, durations
+
+def shared_fingerprints(source_file, module_name, pending):
+    """{variant: source module or earlier variant with the same AST fingerprint} among ``pending``.
+
+    Those variants are not run again; they take the verdict of their twin.
+    """
+    def fingerprint_of(path):
+        try:
+            return file_fingerprint(path)
+        except (OSError, SyntaxError, ValueError):
+            return None
+
+    runs = {}
+    source_fingerprint = fingerprint_of(source_file)
+    if source_fingerprint is not None:
+        runs[source_fingerprint] = module_name
+    same_as = {}
+    for name, (_, path, _) in pending.items():
+        if name == module_name:
+            continue
+        variant_fingerprint = fingerprint_of(path)
+        if variant_fingerprint is None:
+            continue
+        if variant_fingerprint in runs:
+            same_as[name] = runs[variant_fingerprint]
+        else:
+            runs[variant_fingerprint] = name
+    return same_as
 
 def get_mod_name(file_path):
     """Extract module name from file path."""
     return os.path.splitext(os.path.basename(file_path))[0]
 
+def pair_digest(*files):
+    """Digest of the files a verdict depends on plus this harness."""
+    return inputs_digest(*(file_hash(path) for path in files), HARNESS_HASH)
+
 SOURCE_DIR = './test/source'
 REF_OUT_DIR = './test/target'
 
-# Initialize result log
-with open(RESULT_LOG, 'w', encoding='utf-8') as f:
-    f.write("Test Results Log\n")
-    f.write("=" * 60 + "\n")
-
-make_dirs('./tests/source_tests', './pynguin-report')
-
-# Get source and refactored files
-source_files = get_files(SOURCE_DIR)
-print(f"Source files found: {source_files}")
-
-file_mapping = {}
-for source_file in source_files:
-    source_module = get_mod_name(source_file)
-    source_base = os.path.basename(source_file).replace('.py', '')
-    refactored_versions = []
-    source_dir = os.path.join(REF_OUT_DIR, source_base)
-    if os.path.exists(source_dir):
-        for pip_no in range(1, 5):
-            ref_file = os.path.join(source_dir, f"PipNo_{pip_no}_{source_base}.py")
-            if os.path.exists(ref_file):
-                refactored_versions.append((f"PipNo_{pip_no}_{source_base}", os.path.dirname(ref_file)))
-    file_mapping[source_module] = refactored_versions
-
-with open('filemap.txt', 'a', encoding='utf-8') as f:
-    f.write(str(file_mapping) + "\n")
-print(f"File mapping: {file_mapping}")
-
-all_tests_pass = True
-
-for source_file in source_files:
+def check_module(source_file, source_sha, refactored_versions, job_dir, deadline, records, options):
+    """Generate tests for one source module and run them against the source and every variant.
+
+    The generated tests are parametrized over the source and all variants
+    that changed since the last run, so one pytest session checks them all.
+    Everything the job writes lives under ``job_dir``; manifest updates are
+    appended to ``records`` for the parent process to apply.
+    """
+    module_name = get_mod_name(source_file)
     if not has_func_or_class(source_file):
         print(f"File doesn't have testable usecases: {source_file}")
-        log_result(get_mod_name(source_file), "N/A", False, "SKIPPED", "No testable functions or classes")
-        continue
+        log_result(module_name, "N/A", False, "SKIPPED", "No testable functions or classes", source_sha=source_sha)
+        return True
 
-    module_name = get_mod_name(source_file)
     print(f"\n=== Processing source module: {module_name} ===")
-    
-    print(f"Generating tests for source module: {module_name}")
-    if not run_pynguin(SOURCE_DIR, './tests/source_tests', module_name):
-        print(f"Failed to generate tests for {module_name}")
-        log_result(module_name, "N/A", False, "FAIL", "Test generation failed")
-        all_tests_pass = False
-        continue
-
-    test_file = os.path.join('./tests/source_tests', f"test_{module_name}.py")
-    if not os.path.exists(test_file):
-        print(f"Test file {test_file} not found.")
-        log_result(module_name, "N/A", False, "FAIL", "Test file not generated")
-        all_tests_pass = False
-        continue
-
-    if not modify_imports(test_file, SOURCE_DIR, module_name, module_name):
-        log_result(module_name, module_name, False, "FAIL", "Import modification failed for source module")
-        all_tests_pass = False
-        continue
-
-    print(f"Running tests against source module: {module_name}")
-    source_result = run_tests(test_file, module_name, is_source=True)
-    log_result(module_name, module_name, source_result, "PASS" if source_result else "FAIL", "Source code test")
-    if not source_result:
-        print(f"Source tests failed for {module_name}")
-        all_tests_pass = False
-        continue
-
-    refactored_versions = file_mapping.get(module_name, [])
-    if not refactored_versions:
-        print(f"No refactored versions for {module_name}. Skipping.")
-        log_result(module_name, "N/A", False, "SKIPPED", "No refactored versions")
-        continue
-
+    # Variants rejected by the static gate in main() are never tested.
+    invalid = options.get("invalid", {})
+    valid_versions = []
     for refactored_module, refactored_path in refactored_versions:
-        print(f"\n=== Testing refactored module: {refactored_module} ===")
+        refactored_module_path = os.path.join(refactored_path, f"{refactored_module}.py")
+        errors = invalid.get(refactored_module_path)
+        if errors:
+            print(f"Invalid variant {module_name} -> {refactored_module}: {errors[0]}")
+            log_result(module_name, refactored_module, False, "INVALID", "; ".join(errors), source_sha=source_sha,
+                       variant_file=refactored_module_path)
+            continue
+        valid_versions.append((refactored_module, refactored_path))
+    if refactored_versions and not valid_versions:
+        print(f"Every variant of {module_name} failed the static checks. Skipping test generation.")
+        return False
+
+    test_file = os.path.join(job_dir, f"test_{module_name}.py")
+    source_digest = pair_digest(source_file)
+    source_current = MANIFEST.is_current(MANIFEST_STAGE, source_file, source_digest) and os.path.exists(test_file)
+
+    if source_current:
+        # Source and harness unchanged: the generated tests and the source verdict still hold.
+        source_result = MANIFEST.get(MANIFEST_STAGE, source_file)["result"]
+        print(f"Source module {module_name} unchanged. Reusing generated tests.")
+        log_result(module_name, module_name, source_result, "PASS" if source_result else "FAIL", "Source code test (unchanged)",
+                   source_sha=source_sha)
+        if not source_result:
+            print(f"Source tests failed for {module_name}")
+            return False
+    else:
+        print(f"Generating tests for source module: {module_name}")
+        started = time.perf_counter()
+        hits = TEST_CACHE.hits
+        with instrument.timed("run_pynguin"):
+            generated = run_pynguin(SOURCE_DIR, job_dir, module_name, deadline)
+        status = "CACHED" if TEST_CACHE.hits > hits else "PASS" if generated else "FAIL"
+        log_result(module_name, module_name, generated, status, "Pynguin test generation", stage="generate_tests",
+                   seconds=time.perf_counter() - started, source_sha=source_sha)
+        if not generated:
+            print(f"Failed to generate tests for {module_name}")
+            log_result(module_name, "N/A", False, "FAIL", "Test generation failed", source_sha=source_sha)
+            return False
+
+        if not os.path.exists(test_file):
+            print(f"Test file {test_file} not found.")
+            log_result(module_name, "N/A", False, "FAIL", "Test file not generated", source_sha=source_sha)
+            return False
+
+    passed = len(valid_versions) == len(refactored_versions)
+    pending = {}
+    if not source_current:
+        pending[module_name] = (os.path.abspath(source_file), source_file, source_digest)
+    for refactored_module, refactored_path in valid_versions:
         refactored_module_path = os.path.join(refactored_path, f"{refactored_module}.py")
         if not os.path.exists(refactored_module_path):
             print(f"Refactored module {refactored_module_path} not found.")
-            log_result(module_name, refactored_module, False, "FAIL", "Refactored module missing")
-            all_tests_pass = False
+            log_result(module_name, refactored_module, False, "FAIL", "Refactored module missing", source_sha=source_sha)
+            passed = False
             continue
 
-        if not modify_imports(test_file, refactored_path, module_name, refactored_module):
-            log_result(module_name, refactored_module, False, "FAIL", "Import modification failed")
-            all_tests_pass = False
+        digest = pair_digest(source_file, refactored_module_path)
+        if MANIFEST.is_current(MANIFEST_STAGE, refactored_module_path, digest):
+            entry = MANIFEST.get(MANIFEST_STAGE, refactored_module_path)
+            print(f"Unchanged since last run: {module_name} -> {refactored_module} ({entry['status']})")
+            log_result(module_name, refactored_module, entry["result"], entry["status"], entry["details"] + " (unchanged)",
+                       source_sha=source_sha, variant_file=refactored_module_path)
+            passed = passed and entry["status"] == "PASS"
             continue
-
-        refactored_result = run_tests(test_file, refactored_module, is_source=False)
-        status = "PASS" if refactored_result == source_result else "FAIL"
-        details = "Behavior matches source" if refactored_result == source_result else "Behavior mismatch"
-        log_result(module_name, refactored_module, refactored_result, status, details)
-        if refactored_result != source_result:
-            print(f"Behavior mismatch for {module_name} -> {refactored_module}")
-            all_tests_pass = False
+        pending[refactored_module] = (os.path.abspath(refactored_module_path), refactored_module_path, digest)
+
+    if pending:
+        with instrument.timed("fingerprint", len(pending)):
+            same_as = shared_fingerprints(source_file, module_name, pending)
+        variants = {name: path for name, (path, _, _) in pending.items() if name not in same_as}
+        if variants:
+            print(f"Running tests against {module_name} and {len(pending) - (not source_current)} variants "
+                  f"({len(same_as)} reuse the verdict of an identical AST)")
+            session = run_variants(test_file, module_name, variants, job_dir, deadline, options)
+            if session is None:
+                print(f"No 'import {module_name} as module_N' in {test_file}")
+                log_result(module_name, module_name, False, "FAIL", "Generated tests do not import the module",
+                           source_sha=source_sha)
+                return False
+            outcomes, durations = session
         else:
-            print(f"Behavior matches for {module_name} -> {refactored_module}")
-
-# Write summary
-summary = "\nAll SRC→REF tests passed." if all_tests_pass else "\nSome SRC→REF tests failed or were skipped. Check 'tests_result.txt' for details."
-print(summary)
-with open(RESULT_LOG, 'a', encoding='utf-8') as f:
-    f.write("=" * 60 + "\n")
-    f.write(summary + "\n")
+            # Every pending variant is an AST twin of a source whose verdict is current: nothing to run.
+            print(f"All {len(same_as)} changed variants of {module_name} have the source's AST; reusing its verdict")
+            outcomes, durations = {}, {}
+        for name, twin in same_as.items():
+            if twin in outcomes:
+                outcomes[name] = outcomes[twin]
+            else:
+                # Twin of a source whose passing verdict is current (a failing one stops earlier).
+                outcomes[name] = PASSED
+            durations[name] = 0.0
+
+        if not source_current:
+            source_outcome = outcomes.pop(module_name)
+            if source_outcome in LIMIT_OUTCOMES:
+                # Limit hits are not recorded, so the next run tries again.
+                log_result(module_name, module_name, False, source_outcome.upper(), "Source code test hit a sandbox limit",
+                           seconds=durations[module_name], source_sha=source_sha)
+                return False
+            source_result = source_outcome == PASSED
+            log_result(module_name, module_name, source_result, "PASS" if source_result else "FAIL", "Source code test",
+                       seconds=durations[module_name], source_sha=source_sha)
+            records.append((source_file, source_digest, {"result": source_result}))
+            if not source_result:
+                print(f"Source tests failed for {module_name}")
+                return False
+
+        for refactored_module, refactored_outcome in outcomes.items():
+            _, refactored_module_path, digest = pending[refactored_module]
+            if refactored_outcome in LIMIT_OUTCOMES:
+                print(f"Sandbox limit for {module_name} -> {refactored_module}: {refactored_outcome}")
+                log_result(module_name, refactored_module, False, refactored_outcome.upper(), "Variant hit a sandbox limit",
+                           seconds=durations[refactored_module], source_sha=source_sha,
+                           variant_file=refactored_module_path)
+                passed = False
+                continue
+            refactored_result = refactored_outcome == PASSED
+            status = "PASS" if refactored_result == source_result else "FAIL"
+            details = "Behavior matches source" if refactored_result == source_result else "Behavior mismatch"
+            if refactored_module in same_as:
+                details += f" (same AST as {same_as[refactored_module]})"
+            log_result(module_name, refactored_module, refactored_result, status, details,
+                       seconds=durations[refactored_module], source_sha=source_sha, variant_file=refactored_module_path)
+            records.append((refactored_module_path, digest,
+                            {"result": refactored_result, "status": status, "details": details}))
+            if refactored_result != source_result:
+                print(f"Behavior mismatch for {module_name} -> {refactored_module}")
+                passed = False
+            else:
+                print(f"Behavior matches for {module_name} -> {refactored_module}")
+
+    if not refactored_versions:
+        print(f"No refactored versions for {module_name}. Skipping.")
+        log_result(module_name, "N/A", False, "SKIPPED", "No refactored versions", source_sha=source_sha)
+    return passed
+
+def run_module_job(job):
+    """Worker entry point: (source_file, refactored_versions, timeout, options) ->
+    (log entries, records, passed, instrumentation records)."""
+    source_file, refactored_versions, timeout, options = job
+    instrument.enable(options["instrumented"])
+    instrument.set_file(source_file)
+    LOG_ENTRIES.clear()
+    records = []
+    module_name = get_mod_name(source_file)
+    # Hashed once here: every result row of the job carries it.
+    source_sha = file_hash(source_file)
+    job_dir = os.path.join(JOBS_DIR, module_name)
+    make_dirs(job_dir)
+    deadline = time.monotonic() + timeout if timeout else None
+    try:
+        with instrument.timed("module_job"):
+            passed = check_module(source_file, source_sha, refactored_versions, job_dir, deadline, records, options)
+    except subprocess.TimeoutExpired:
+        print(f"Job for {module_name} ran out of time")
+        log_result(module_name, "N/A", False, "FAIL", f"Job timed out after {timeout}s", source_sha=source_sha)
+        passed = False
+    except Exception as e:
+        print(f"Job for {module_name} failed: {e}")
+        log_result(module_name, "N/A", False, "FAIL", f"Unexpected error: {e}", source_sha=source_sha)
+        passed = False
+    return list(LOG_ENTRIES), records, passed, instrument.drain()
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate tests per source module and check every PipNo variant.")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel module jobs (default: CPU count)")
+    parser.add_argument("--timeout", type=float, default=JOB_TIMEOUT,
+                        help="Wall-clock seconds allowed per module job (0 disables)")
+    parser.add_argument("--variant-workers", type=int, default=0,
+                        help="pytest-xdist workers per module session (0 runs it in one process)")
+    parser.add_argument("--memory-mb", type=int, default=SANDBOX_MEMORY_MB,
+                        help="Address-space limit of the sandbox running the tests (0 disables)")
+    parser.add_argument("--cpu-seconds", type=int, default=SANDBOX_CPU_SECONDS,
+                        help="CPU time allowed per pytest session or single test (0 disables)")
+    parser.add_argument("--session-timeout", type=float, default=SANDBOX_WALL_SECONDS,
+                        help="Wall-clock seconds allowed per pytest session (0 disables)")
+    parser.add_argument("--results", default=DEFAULT_RESULT_STORE, help="SQLite result store")
+    parser.add_argument("--no-validate", action="store_true",
+                        help="Test every variant, including those that fail the static validity checks")
+    instrument.add_argument(parser)
+    args = parser.parse_args()
+    instrument.enable(args.instrument is not None)
+
+    make_dirs(JOBS_DIR)
+
+    # Get source and refactored files
+    index = CorpusIndex(SOURCE_DIR, REF_OUT_DIR)
+    source_files = [os.path.abspath(index.source_path(name)) for name in index.sources]
+    print(f"Source files found: {source_files}")
+
+    file_mapping = {}
+    for name in index.sources:
+        file_mapping[get_mod_name(name)] = [(variant_module, os.path.dirname(variant_path))
+                                            for _, variant_module, variant_path in index.variants(name) or []]
+    print(f"File mapping: {file_mapping}")
+
+    invalid = {}
+    if not args.no_validate:
+        pairs = [(index.source_path(name), variant_path) for name in index.sources
+                 for _, _, variant_path in index.variants(name) or []]
+        with instrument.timed("validity_gate", len(pairs)):
+            for source_path, variant_path, report in validate_pairs(pairs, args.workers):
+                if not report["valid"]:
+                    invalid.setdefault(get_mod_name(source_path), {})[variant_path] = report["errors"]
+        print(f"Static checks rejected {sum(map(len, invalid.values()))} of {len(pairs)} variants")
+
+    options = {"variant_workers": args.variant_workers, "memory_mb": args.memory_mb,
+               "cpu_seconds": args.cpu_seconds, "wall_seconds": args.session_timeout,
+               "instrumented": instrument.enabled()}
+    jobs = [(source_file, file_mapping.get(get_mod_name(source_file), []), args.timeout,
+             dict(options, invalid=invalid.get(get_mod_name(source_file), {})))
+            for source_file in source_files]
+    workers = args.workers or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    results = executor.map(run_module_job, jobs) if executor else map(run_module_job, jobs)
+
+    all_tests_pass = True
+    store = ResultStore(args.results)
+    try:
+        # Merged in source order, whatever order the jobs finish in.
+        for entries, records, passed, timings in results:
+            instrument.merge(timings)
+            for entry in entries:
+                store.add_record(entry)
+            for key, digest, data in records:
+                MANIFEST.record(MANIFEST_STAGE, key, digest, **data)
+            all_tests_pass = all_tests_pass and passed
+        print_summary(store, run_id=store.run_id)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        MANIFEST.save()
+        store.close()
+    if args.instrument:
+        instrument.report(args.instrument)
+
+    summary = "\nAll SRC→REF tests passed." if all_tests_pass else f"\nSome SRC→REF tests failed or were skipped. Check '{args.results}' for details."
+    print(summary)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+import argparse
+import ast
+import builtins
+import json
+import os
+import symtable
+from concurrent.futures import ProcessPoolExecutor
+
+import instrument
+from corpus_index import CorpusIndex
+from diffexec import rename_candidates
+
+DEFAULT_REPORT = "validity.json"
+MODULE_NAMES = {"__name__", "__file__", "__doc__", "__spec__", "__loader__", "__package__", "__builtins__",
+                "__path__", "__annotations__", "__dict__", "__qualname__", "__module__", "__class__"}
+KNOWN_NAMES = set(dir(builtins)) | MODULE_NAMES
+
+
+def walk_tables(table):
+    yield table
+    for child in table.get_children():
+        yield from walk_tables(child)
+
+
+def star_imports(tree):
+    return any(alias.name == "*" for node in ast.walk(tree) if isinstance(node, ast.ImportFrom)
+               for alias in node.names)
+
+
+def undefined_names(code, filename="<variant>", tree=None):
+    """Names that are read but bound nowhere: not in their scope, an enclosing one, the module or builtins."""
+    tree = tree if tree is not None else ast.parse(code, filename)
+    if star_imports(tree):
+        # A star import can bind anything; symtable does not list it as a symbol.
+        return []
+    module = symtable.symtable(code, filename, "exec")
+    module_symbols = {symbol.get_name(): symbol for symbol in module.get_symbols()}
+    defined = {name for name, symbol in module_symbols.items()
+               if symbol.is_assigned() or symbol.is_imported() or symbol.is_namespace()}
+    declared = {symbol.get_name() for table in walk_tables(module) for symbol in table.get_symbols()
+                if symbol.is_declared_global()}
+    missing = []
+    for table in walk_tables(module):
+        for symbol in table.get_symbols():
+            name = symbol.get_name()
+            if not symbol.is_referenced() or name in KNOWN_NAMES or name in defined or name in declared:
+                continue
+            if table is not module and (symbol.is_parameter() or symbol.is_local() or symbol.is_free()):
+                # Bound in this scope or an enclosing one. is_global() alone is not trusted: 3.11
+                # reports every symbol of a function named "top" as global.
+                continue
+            if not symbol.is_assigned() and not symbol.is_imported():
+                missing.append((table.get_name(), name))
+    return sorted(set(missing))
+
+
+class LoadBeforeStore(ast.NodeVisitor):
+    """Locals of one function that are read before any assignment, in evaluation order.
+
+    Nested functions, classes, lambdas and comprehensions are scopes of their
+    own and are not entered. Loops and branches are not followed, so a hit is
+    only a possibly unbound name.
+    """
+
+    def __init__(self, local_names):
+        self.local_names = local_names
+        self.stored = set()
+        self.unbound = []
+
+    def visit_Name(self, node):
+        if node.id not in self.local_names:
+            return
+        if isinstance(node.ctx, ast.Load) and node.id not in self.stored:
+            self.unbound.append(node.id)
+        self.stored.add(node.id)
+
+    def visit_Assign(self, node):
+        self.visit(node.value)
+        for target in node.targets:
+            self.visit(target)
+
+    def visit_AnnAssign(self, node):
+        if node.value is not None:
+            self.visit(node.value)
+        self.visit(node.target)
+
+    def visit_AugAssign(self, node):
+        if isinstance(node.target, ast.Name) and node.target.id in self.local_names and node.target.id not in self.stored:
+            self.unbound.append(node.target.id)
+        self.visit(node.value)
+        self.visit(node.target)
+
+    def visit_NamedExpr(self, node):
+        self.visit(node.value)
+        self.visit(node.target)
+
+    def visit_scope(self, node):
+        pass
+
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = visit_Lambda = visit_scope
+    visit_ListComp = visit_SetComp = visit_DictComp = visit_GeneratorExp = visit_scope
+
+
+def unbound_names(tree):
+    found = []
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        arguments = node.args
+        parameters = {arg.arg for arg in arguments.posonlyargs + arguments.args + arguments.kwonlyargs}
+        parameters.update(arg.arg for arg in (arguments.vararg, arguments.kwarg) if arg is not None)
+        declared = {name for stmt in ast.walk(node) if isinstance(stmt, (ast.Global, ast.Nonlocal))
+                    for name in stmt.names}
+        assigned = set()
+        for child in node.body:
+            for sub in ast.walk(child):
+                if isinstance(sub, ast.Name) and isinstance(sub.ctx, ast.Store):
+                    assigned.add(sub.id)
+        visitor = LoadBeforeStore(assigned - parameters - declared)
+        for child in node.body:
+            visitor.visit(child)
+        found.extend((node.name, name) for name in dict.fromkeys(visitor.unbound))
+    return found
+
+
+def signature(arguments, returns=None):
+    positional = arguments.posonlyargs + arguments.args
+    annotated = returns is not None or any(arg.annotation is not None for arg in positional + arguments.kwonlyargs)
+    return {
+        "positional": len(positional),
+        "required": len(positional) - len(arguments.defaults),
+        "kwonly": [arg.arg for arg in arguments.kwonlyargs],
+        "kwonly_required": [arg.arg for arg, default in zip(arguments.kwonlyargs, arguments.kw_defaults)
+                            if default is None],
+        "vararg": arguments.vararg is not None,
+        "kwarg": arguments.kwarg is not None,
+        "annotated": annotated,
+    }
+
+
+def signatures(tree):
+    """{name or Class.method: signature} for module-level functions, lambdas bound to a name and methods."""
+    found = {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            found[node.name] = signature(node.args, node.returns)
+        elif isinstance(node, ast.Assign) and isinstance(node.value, ast.Lambda):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    found[target.id] = signature(node.value.args)
+        elif isinstance(node, ast.ClassDef):
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    found[f"{node.name}.{item.name}"] = signature(item.args, item.returns)
+    return found
+
+
+def compare_signatures(source_signatures, variant_signatures, candidates):
+    errors = []
+    warnings = []
+    for name, expected in source_signatures.items():
+        owner, _, function = name.rpartition(".")
+        prefix = f"{owner}." if owner else ""
+        match = next((prefix + candidate for candidate in candidates.get(function, [function])
+                      if prefix + candidate in variant_signatures), None)
+        if match is None:
+            errors.append(f"{name}: missing in variant")
+            continue
+        actual = variant_signatures[match]
+        if actual["required"] > expected["required"]:
+            errors.append(f"{name}: requires {actual['required']} positional arguments, source {expected['required']}")
+        if actual["positional"] < expected["positional"] and not actual["vararg"]:
+            errors.append(f"{name}: takes {actual['positional']} positional arguments, source {expected['positional']}")
+        dropped = [arg for arg in expected["kwonly"] if arg not in actual["kwonly"]]
+        if dropped and not actual["kwarg"]:
+            errors.append(f"{name}: keyword-only arguments dropped: {', '.join(dropped)}")
+        added = [arg for arg in actual["kwonly_required"] if arg not in expected["kwonly_required"]]
+        if added:
+            errors.append(f"{name}: new required keyword-only arguments: {', '.join(added)}")
+        if expected["vararg"] and not actual["vararg"]:
+            errors.append(f"{name}: *args dropped")
+        if expected["kwarg"] and not actual["kwarg"]:
+            errors.append(f"{name}: **kwargs dropped")
+        if expected["annotated"] and not actual["annotated"]:
+            warnings.append(f"{name}: annotations dropped")
+    return errors, warnings
+
+
+def check_variant(source_code, variant_code, filename="<variant>", candidates=None):
+    """{"valid": bool, "errors": [...], "warnings": [...]} for one variant of ``source_code``.
+
+    Errors mean the variant cannot behave like its source: it does not
+    compile, reads names that are bound nowhere, or cannot be called the way
+    the source can. Warnings (possibly unbound locals, dropped annotations)
+    do not make a variant invalid.
+    """
+    errors = []
+    warnings = []
+    try:
+        compile(variant_code, filename, "exec", dont_inherit=True)
+        tree = ast.parse(variant_code, filename)
+    except (SyntaxError, ValueError) as e:
+        return {"valid": False, "errors": [f"does not compile: {e}"], "warnings": []}
+
+    source_missing = set()
+    try:
+        source_tree = ast.parse(source_code)
+        source_missing = {name for _, name in undefined_names(source_code, tree=source_tree)}
+    except (SyntaxError, ValueError):
+        source_tree = None
+    # Names the source leaves undefined too are not the variant's fault.
+    errors.extend(f"{scope}: undefined name {name!r}" for scope, name in undefined_names(variant_code, filename, tree)
+                  if name not in source_missing)
+    warnings.extend(f"{scope}: {name!r} may be used before assignment" for scope, name in unbound_names(tree))
+    if source_tree is None:
+        warnings.append("source does not parse; signatures not compared")
+    else:
+        candidates = candidates if candidates is not None else rename_candidates()
+        signature_errors, signature_warnings = compare_signatures(signatures(source_tree), signatures(tree), candidates)
+        errors.extend(signature_errors)
+        warnings.extend(signature_warnings)
+    return {"valid": not errors, "errors": errors, "warnings": warnings}
+
+
+def check_files(pair):
+    """Pool task: (source path, variant path) -> (source path, variant path, report, instrumentation records)."""
+    with instrument.timed("validity", file=pair[1]):
+        result = check_pair(*pair)
+    return result + (instrument.drain(),)
+
+
+def check_pair(source_path, variant_path):
+    try:
+        with open(source_path, 'r', encoding='utf-8') as f:
+            source_code = f.read()
+        with open(variant_path, 'r', encoding='utf-8') as f:
+            variant_code = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return source_path, variant_path, {"valid": False, "errors": [f"unreadable: {e}"], "warnings": []}
+    return source_path, variant_path, check_variant(source_code, variant_code, variant_path)
+
+
+def validate_pairs(pairs, workers=None, chunksize=16):
+    """Yield (source path, variant path, report) for (source path, variant path) pairs, in input order."""
+    pairs = list(pairs)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(pairs) <= chunksize:
+        results = map(check_files, pairs)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=instrument.enable,
+                                       initargs=(instrument.enabled(),))
+        results = executor.map(check_files, pairs, chunksize=chunksize)
+    try:
+        for source_path, variant_path, report, timings in results:
+            instrument.merge(timings)
+            yield source_path, variant_path, report
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def validate_corpus(index, workers=None):
+    """{variant path: report} for every pair in a CorpusIndex."""
+    pairs = [(source_path, variant_path) for source_path, _, variant_path in index.pairs()]
+    return {variant_path: report for _, variant_path, report in validate_pairs(pairs, workers)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Statically check every PipNo variant before scoring or testing it.")
+    parser.add_argument("--source", default="source")
+    parser.add_argument("--target", default="target")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--output", default=DEFAULT_REPORT)
+    instrument.add_argument(parser)
+    args = parser.parse_args()
+    instrument.enable(args.instrument is not None)
+
+    reports = validate_corpus(CorpusIndex(args.source, args.target), args.workers)
+    invalid = 0
+    for variant_path, report in reports.items():
+        if not report["valid"]:
+            invalid += 1
+            print(f"INVALID {variant_path}: {'; '.join(report['errors'])}")
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(reports, f, indent=1)
+    print(f"{invalid} of {len(reports)} variants invalid; report written to {args.output}")
+    if args.instrument:
+        instrument.report(args.instrument)
+
+
+if __name__ == "__main__":
+    main()
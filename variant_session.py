@@ -0,0 +1,124 @@
+import re
+import xml.etree.ElementTree as ET
+
+from sandbox import CPU_LIMIT, MEMORY_LIMIT
+
+PASSED = "pass"
+FAILED = "fail"
+
+ALIAS_IMPORT = r'^\s*import\s+{module}\s+as\s+(module_\d+)\s*$'
+
+SESSION_HEADER = '''import importlib.util
+import sys
+
+import pytest
+
+sys.path.insert(0, {source_dir!r})
+VARIANTS = {variants!r}
+ALIASES = {aliases!r}
+_loaded = {{}}
+
+
+def _load(name):
+    if name not in _loaded:
+        spec = importlib.util.spec_from_file_location(name, VARIANTS[name])
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+        _loaded[name] = module
+    return _loaded[name]
+
+
+@pytest.fixture(autouse=True, params=list(VARIANTS))
+def variant(request):
+    module = _load(request.param)
+    for alias in ALIASES:
+        globals()[alias] = module
+    return request.param
+
+
+'''
+
+
+def write_session(test_file, session_file, module_name, variants, source_dir):
+    """Turn the cleaned Pynguin tests for ``module_name`` into one module covering every variant.
+
+    ``variants`` maps a variant name to its file; it is the pytest param id, so
+    every test shows up once per variant as ``test_x[<variant>]``. Only the
+    aliases Pynguin bound to ``module_name`` are rebound; imports of other
+    modules are kept as generated.
+    """
+    with open(test_file, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+
+    alias_import = re.compile(ALIAS_IMPORT.format(module=re.escape(module_name)))
+    aliases = []
+    body = []
+    for line in lines:
+        match = alias_import.match(line)
+        if match:
+            aliases.append(match.group(1))
+        elif not line.strip().startswith('sys.path.insert'):
+            body.append(line)
+    if not aliases:
+        return False
+
+    header = SESSION_HEADER.format(source_dir=source_dir, variants=dict(variants), aliases=sorted(set(aliases)))
+    with open(session_file, 'w', encoding='utf-8') as f:
+        f.write(header)
+        f.writelines(body)
+    return True
+
+
+def case_outcome(case):
+    problems = [element for element in case if element.tag in ("failure", "error")]
+    if not problems:
+        return PASSED
+    text = " ".join(f"{element.get('message', '')} {element.text or ''}" for element in problems)
+    # Limits hit inside a sandbox worker surface as the exception that failed the test.
+    if "CpuLimitExceeded" in text:
+        return CPU_LIMIT
+    if "MemoryError" in text:
+        return MEMORY_LIMIT
+    return FAILED
+
+
+def read_outcomes(junit_file, variants):
+    """{variant: pass, fail, cpu_limit or memory_limit} from a pytest --junitxml report.
+
+    A variant without any reported test counts as failed, like a pytest run
+    that collected nothing; a limit hit by any of its tests wins over a
+    plain failure.
+    """
+    severity = [None, PASSED, FAILED, MEMORY_LIMIT, CPU_LIMIT]
+    outcomes = dict.fromkeys(variants)
+    for case in ET.parse(junit_file).iter("testcase"):
+        name = case.get("name", "")
+        if not name.endswith("]") or "[" not in name:
+            continue
+        ids = name[name.index("[") + 1:-1].split("-")
+        variant = next((param for param in ids if param in outcomes), None)
+        if variant is None:
+            continue
+        outcomes[variant] = max(outcomes[variant], case_outcome(case), key=severity.index)
+    return {variant: outcome or FAILED for variant, outcome in outcomes.items()}
+
+
+def read_durations(junit_file, variants):
+    """{variant: seconds its tests took} from a pytest --junitxml report."""
+    durations = dict.fromkeys(variants, 0.0)
+    for case in ET.parse(junit_file).iter("testcase"):
+        name = case.get("name", "")
+        if not name.endswith("]") or "[" not in name:
+            continue
+        variant = next((param for param in name[name.index("[") + 1:-1].split("-") if param in durations), None)
+        if variant is not None:
+            durations[variant] += float(case.get("time") or 0)
+    return durations
+
+
+def pytest_session(args):
+    """Sandbox task: one in-process pytest run; returns its exit code."""
+    import pytest
+
+    return int(pytest.main(list(args)))